@@ -0,0 +1,115 @@
+'''
+On-disk index of the Pitt Ads annotation files.
+
+Symbols.json, Topics.json and Sentiments.json each hold one JSON object for
+the whole corpus, keyed like '10/170741.png'. Parsing them in full just to
+use one folder is the slow part of data collection, so the first run splits
+each file into one row per key in an SQLite index, tagged with the key's
+folder. Later runs read and decode only the rows of the requested folders,
+for any number of folders in one query.
+
+Each source file is fingerprinted (size + mtime); a file that changed is
+re-indexed on the next load.
+'''
+
+import json
+import os
+import sqlite3
+
+
+INDEX_PATH = 'annotations_index.sqlite'
+INSERT_BATCH = 10000
+
+
+def key_folder(key):
+    ''' '10/170741.png' -> '10' (keys without a folder -> '')'''
+    return key.split('/', 1)[0] if '/' in key else ''
+
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+class AnnotationIndex:
+    def __init__(self, path = INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS annotations (
+        source TEXT NOT NULL,
+        folder TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_annotations_folder ON annotations(source, folder);
+        CREATE TABLE IF NOT EXISTS sources (
+        source TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+        );
+        ''')
+        self.conn.commit()
+
+    def is_current(self, source, json_path):
+        found = self.conn.execute('SELECT fingerprint FROM sources WHERE source = ?', (source,)).fetchone()
+        return found is not None and found[0] == file_fingerprint(json_path)
+
+    def build(self, source, json_path):
+        ''' (Re)indexes one annotation file; rows keep the file's key order'''
+        with open(json_path, 'r') as f: data = json.load(f)
+        with self.conn:
+            self.conn.execute('DELETE FROM annotations WHERE source = ?', (source,))
+            batch = []
+            for key, value in data.items():
+                batch.append((source, key_folder(key), key, json.dumps(value, separators = (',', ':'))))
+                if len(batch) >= INSERT_BATCH:
+                    self.conn.executemany('INSERT INTO annotations VALUES (?,?,?,?)', batch)
+                    batch.clear()
+            self.conn.executemany('INSERT INTO annotations VALUES (?,?,?,?)', batch)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sources VALUES (?,?)', (source, file_fingerprint(json_path))
+            )
+        return len(data)
+
+    def ensure(self, source, json_path):
+        ''' Builds the index for json_path unless it is already current. Returns True if rebuilt'''
+        if self.is_current(source, json_path): return False
+        n = self.build(source, json_path)
+        print(f'Indexed {n} keys of {json_path}')
+        return True
+
+    def folders(self, source):
+        ''' {folder: number of keys}'''
+        return dict(self.conn.execute(
+            'SELECT folder, COUNT(*) FROM annotations WHERE source = ? GROUP BY folder', (source,)
+        ))
+
+    def load(self, source, folders):
+        ''' {key: parsed annotation} for the given folders, in file order'''
+        folders = list(folders)
+        marks = ','.join('?' * len(folders))
+        rows = self.conn.execute(
+            f'SELECT key, value FROM annotations WHERE source = ? AND folder IN ({marks}) ORDER BY rowid',
+            (source, *folders)
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+def load_annotations(sources, folders, index_path = INDEX_PATH):
+    '''
+    sources: {name: json path}
+    Returns {name: {key: annotation}} restricted to the given folders
+    '''
+    index = AnnotationIndex(index_path)
+    try:
+        out = {}
+        for name, json_path in sources.items():
+            index.ensure(name, json_path)
+            out[name] = index.load(name, folders)
+        return out
+    finally:
+        index.close()
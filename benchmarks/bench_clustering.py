@@ -0,0 +1,98 @@
+"""
+Wall time and peak RSS of the strategy clustering algorithms by dataset size.
+
+Inputs are the cached reduced feature matrix (strategy clustering/features.py)
+resampled with small Gaussian jitter up to each size. Every algorithm runs in
+a fresh child process, which reports its own wall time and peak RSS:
+  kmeans             full KMeans(n_clusters=4), as in the original notebook
+  minibatch_kmeans   clustering.kmeans_labels
+  hdbscan_full       HDBSCAN on the raw matrix, as in the original notebook
+  hdbscan_knn        clustering.hdbscan_labels (precomputed kNN graph)
+  silhouette_full    silhouette_score on every point (O(n^2))
+  silhouette_sample  clustering.sampled_silhouette
+The notebook's algorithms are skipped above MAX_BASELINE_ROWS.
+
+Run from the project root:
+    python benchmarks/bench_clustering.py [n_rows ...]
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'strategy clustering'))
+
+SIZES = [5_000, 20_000, 50_000]
+MAX_BASELINE_ROWS = 20_000
+JITTER = 0.01
+K = 4
+MIN_CLUSTER_SIZE = 10
+SEED = 0
+
+ALGORITHMS = ['kmeans', 'minibatch_kmeans', 'hdbscan_full', 'hdbscan_knn', 'silhouette_full', 'silhouette_sample']
+BASELINES = {'kmeans', 'hdbscan_full', 'silhouette_full'}
+
+
+def make_matrix(n_rows: int) -> np.ndarray:
+    from features import load_reduced
+
+    _, X, _ = load_reduced()
+    rng = np.random.default_rng(SEED)
+    rows = rng.integers(0, X.shape[0], n_rows)
+    return (X[rows] + rng.normal(0, JITTER, (n_rows, X.shape[1]))).astype(np.float32)
+
+
+def run_algorithm(name: str, matrix_path: str):
+    """Child process body: one algorithm, prints seconds and peak RSS as JSON."""
+    import clustering
+    from sklearn.cluster import HDBSCAN, KMeans
+    from sklearn.metrics import silhouette_score
+
+    X = np.load(matrix_path)
+    labels = np.arange(len(X)) % K  # silhouette inputs
+    run = {
+        'kmeans': lambda: KMeans(n_clusters=K, random_state=42).fit_predict(X),
+        'minibatch_kmeans': lambda: clustering.kmeans_labels(X, K),
+        'hdbscan_full': lambda: HDBSCAN(min_cluster_size=MIN_CLUSTER_SIZE, copy=True).fit_predict(X),
+        'hdbscan_knn': lambda: clustering.hdbscan_labels(X, MIN_CLUSTER_SIZE),
+        'silhouette_full': lambda: silhouette_score(X, labels),
+        'silhouette_sample': lambda: clustering.sampled_silhouette(X, labels),
+    }[name]
+    t0 = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak_mb}))
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'rows':>8} {'algorithm':>18} {'seconds':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in sizes:
+            matrix_path = os.path.join(tmp, 'X.npy')
+            np.save(matrix_path, make_matrix(n_rows))
+            for name in ALGORITHMS:
+                if name in BASELINES and n_rows > MAX_BASELINE_ROWS:
+                    print(f"{n_rows:>8} {name:>18} {'skipped':>8}")
+                    continue
+                proc = subprocess.run(
+                    [sys.executable, __file__, '--child', name, matrix_path],
+                    capture_output=True, text=True, check=True,
+                )
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"{n_rows:>8} {name:>18} {r['seconds']:>8.2f} {r['peak_mb']:>8.0f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        run_algorithm(*sys.argv[2:4])
+    else:
+        main()
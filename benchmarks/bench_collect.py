@@ -0,0 +1,63 @@
+'''
+Collection throughput (annotation keys per second) against worker count.
+
+Runs data_collect.collect over the given image folders (every folder in the
+annotations by default) with 1, 2, 4, ... workers up to the available cores,
+writing to a temporary CSV. The annotation index is built before the first
+timed run, and every run must produce the same CSV bytes. Prints keys per
+second, speedup and parallel efficiency.
+
+Run from the project root (next to Symbols.json / Topics.json / ...):
+    python benchmarks/bench_collect.py [folder ...]
+'''
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_collect
+from annotation_index import AnnotationIndex
+
+
+def worker_counts(cores):
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+def digest(path):
+    with open(path, 'rb') as f: return hashlib.sha256(f.read()).hexdigest()
+
+
+if __name__ == '__main__':
+    index = AnnotationIndex(data_collect.ANNOTATION_INDEX)
+    try:
+        for name, json_path in data_collect.ANNOTATION_SOURCES.items(): index.ensure(name, json_path)
+        keys_per_folder = index.folders('symbols')
+    finally:
+        index.close()
+    folders = sys.argv[1:] or sorted(keys_per_folder)
+    n_keys = sum(keys_per_folder.get(f, 0) for f in folders)
+    if not n_keys: sys.exit(f'No annotation keys in folders {folders}')
+
+    table, digests = [], set()
+    with tempfile.TemporaryDirectory() as tmp:
+        data_collect.OUTPUT_CSV = os.path.join(tmp, 'collected_ads.csv')
+        for workers in worker_counts(min(data_collect.available_cores(), len(folders))):
+            start = time.perf_counter()
+            data_collect.collect(folders, num_workers = workers, shard = False)
+            table.append((workers, n_keys / (time.perf_counter() - start)))
+            digests.add(digest(data_collect.OUTPUT_CSV))
+
+    base = table[0][1]
+    print()
+    print(f'{len(folders)} folders, {n_keys} keys, identical output: {len(digests) == 1}')
+    print(f'{"workers":>8} {"keys/s":>10} {"speedup":>8} {"efficiency":>10}')
+    for workers, rate in table:
+        print(f'{workers:>8} {rate:>10.0f} {rate / base:>7.2f}x {rate / base / workers:>10.0%}')
@@ -0,0 +1,100 @@
+'''
+Load time and peak RSS: CSV against the Parquet copy (columnar.py).
+
+Builds a large enriched table by repeating collected_ads_enriched.csv (with
+fresh ad_ids) up to n_rows, converts it with columnar.write_copy, then loads
+it in several ways, each in a fresh child process that reports its own wall
+time and peak RSS:
+  csv_full / parquet_full            every column as a DataFrame
+  csv_projected / parquet_projected  only PROJECTED_COLUMNS (what the NLP stage reads)
+  csv_chunks / parquet_chunks        PROJECTED_COLUMNS in chunks (nlp/streaming_tfidf.py)
+
+Run from the project root:
+    python benchmarks/bench_columnar.py [n_rows]
+'''
+
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+
+INPUT_CSV = 'collected_ads_enriched.csv'
+N_ROWS = 200000
+PROJECTED_COLUMNS = ['ad_id', 'ocr_text', 'ocr_word_count']
+MODES = ['csv_full', 'parquet_full', 'csv_projected', 'parquet_projected', 'csv_chunks', 'parquet_chunks']
+CHUNK_SIZE = 5000
+
+
+def write_table(path, n_rows):
+    with open(INPUT_CSV, 'r', encoding = 'utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        rows = list(reader)
+    with open(path, 'w', newline = '', encoding = 'utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames = fields)
+        writer.writeheader()
+        for i in range(n_rows):
+            row = dict(rows[i % len(rows)], ad_id = str(i + 1))
+            writer.writerow(row)
+
+
+def load(mode, csv_path):
+    ''' Child process body: one load, prints seconds and peak RSS as JSON'''
+    import pandas  # imported before the clock starts, as by every reading stage
+
+    if mode.startswith('csv'): columnar.ENABLED = False  # forces the CSV path
+    columns = None if mode.endswith('full') else PROJECTED_COLUMNS
+    start = time.perf_counter()
+    if mode.endswith('chunks'):
+        n = sum(len(chunk) for chunk in columnar.iter_frames(csv_path, columns, CHUNK_SIZE))
+    else:
+        n = len(columnar.read_frame(csv_path, columns))
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'rows': n, 'seconds': seconds, 'peak_mb': peak_mb}))
+
+
+def prepare(csv_path, n_rows):
+    ''' Child process body: writes the CSV and its Parquet copy, prints the conversion time'''
+    write_table(csv_path, int(n_rows))
+    start = time.perf_counter()
+    columnar.write_copy(csv_path)
+    print(json.dumps({'seconds': time.perf_counter() - start}))
+
+
+def run_child(*args):
+    proc = subprocess.run(
+        [sys.executable, __file__, *args], capture_output = True, text = True, check = True
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        load(*sys.argv[2:4])
+        sys.exit()
+    if sys.argv[1:2] == ['--prepare']:
+        prepare(*sys.argv[2:4])
+        sys.exit()
+    if not columnar.available(): sys.exit('pyarrow is not installed')
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        # the parent stays small: peak RSS carries over into the children
+        csv_path = os.path.join(tmp, 'ads.csv')
+        convert = run_child('--prepare', csv_path, str(n_rows))['seconds']
+        print(f'{n_rows} rows | csv {os.path.getsize(csv_path) / 2**20:.0f} MB | '
+              f'parquet {os.path.getsize(columnar.parquet_path(csv_path)) / 2**20:.0f} MB | '
+              f'conversion {convert:.1f}s')
+        print(f'{"mode":>18} {"seconds":>8} {"peak MB":>8}')
+        for mode in MODES:
+            r = run_child('--child', mode, csv_path)
+            print(f'{mode:>18} {r["seconds"]:>8.2f} {r["peak_mb"]:>8.0f}')
@@ -0,0 +1,71 @@
+'''
+Extraction throughput against core count.
+
+Runs extraction.extract_all on the same sample of collected_ads.csv with
+1, 2, 4, ... workers up to the available cores. The feature cache is off and
+every run starts from an empty checkpoint. Prints a scaling table of images
+per second, speedup and parallel efficiency.
+
+Run from the project root:
+    python benchmarks/bench_extraction_scaling.py [n_images]
+'''
+
+import csv
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+import extraction
+
+INPUT_CSV = 'collected_ads.csv'
+N_IMAGES = 200
+
+
+def write_sample(path, n):
+    with open(INPUT_CSV, 'r', encoding = 'utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        rows = []
+        for row in reader:
+            if not os.path.exists(row['image_path']): continue
+            row['image_path'] = os.path.abspath(row['image_path'])
+            rows.append(row)
+            if len(rows) >= n: break
+    with open(path, 'w', newline = '', encoding = 'utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames = fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def worker_counts(cores):
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_IMAGES
+    helpers.FEATURE_CACHE_PATH = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        extraction.INPUT_CSV = os.path.join(tmp, 'sample.csv')
+        extraction.OUTPUT_CSV = os.path.join(tmp, 'sample_enriched.csv')
+        extraction.CHECKPOINT_DB = os.path.join(tmp, 'checkpoint.sqlite')
+        if not write_sample(extraction.INPUT_CSV, n): sys.exit(f'No images found from {INPUT_CSV}')
+
+        table = []
+        for workers in worker_counts(extraction.available_cores()):
+            summary = extraction.extract_all(resume = False, num_workers = workers)
+            table.append((workers, summary['tesseract_threads'], summary['processed'] / summary['seconds']))
+
+    base = table[0][2]
+    print()
+    print(f'{"workers":>8} {"omp":>4} {"img/s":>8} {"speedup":>8} {"efficiency":>10}')
+    for workers, threads, rate in table:
+        print(f'{workers:>8} {threads:>4} {rate:>8.2f} {rate / base:>7.2f}x {rate / base / workers:>10.0%}')
@@ -0,0 +1,72 @@
+"""
+Cold-start budget for nlp/analyze_image_text.py.
+
+Imports the module in a fresh interpreter under `python -X importtime`
+(best of a few runs), prints the slowest imports by cumulative time and
+fails if the total is over COLD_START_BUDGET_MS, or if a module that should
+only load on demand (NLTK, pandas, scikit-learn, ...) was imported eagerly.
+
+Run from the project root:
+    python benchmarks/bench_nlp_cold_start.py [budget_ms]
+"""
+
+import os
+import subprocess
+import sys
+
+NLP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nlp')
+MODULE = 'analyze_image_text'
+COLD_START_BUDGET_MS = 250
+RUNS = 3
+SHOW_TOP = 10
+LAZY_MODULES = ('nltk', 'textblob', 'pandas', 'numpy', 'sklearn', 'scipy')
+
+
+def import_times(module: str) -> dict[str, int]:
+    """{module: cumulative import time in µs} from one cold interpreter.
+
+    Raises RuntimeError if the import itself fails (e.g. missing NLTK data).
+    """
+    code = f"import sys; sys.path.insert(0, {NLP_DIR!r}); import {module}"
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True,
+    )
+    if proc.returncode:
+        errors = [l for l in proc.stderr.splitlines() if 'Error' in l] or [f'exit status {proc.returncode}']
+        raise RuntimeError(errors[-1].strip())
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> int:
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else COLD_START_BUDGET_MS
+    try:
+        runs = [import_times(MODULE) for _ in range(RUNS)]
+    except RuntimeError as e:
+        print(f"FAIL: import {MODULE} failed: {e}")
+        return 1
+    best = min(runs, key=lambda t: t[MODULE])
+    total_ms = best[MODULE] / 1000
+
+    print(f"import {MODULE}: {total_ms:.1f} ms (best of {RUNS}, budget {budget_ms:.0f} ms)")
+    print(f"{'cumulative ms':>14}  module")
+    top_level = {name: us for name, us in best.items() if name != MODULE}
+    for name, us in sorted(top_level.items(), key=lambda kv: -kv[1])[:SHOW_TOP]:
+        print(f"{us / 1000:>14.1f}  {name}")
+
+    eager = sorted({name.split('.')[0] for name in best} & set(LAZY_MODULES))
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+    if total_ms > budget_ms:
+        print(f"FAIL: {total_ms:.1f} ms is over the {budget_ms:.0f} ms budget")
+    return 1 if eager or total_ms > budget_ms else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
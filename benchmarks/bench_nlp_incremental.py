@@ -0,0 +1,87 @@
+"""
+Incremental NLP analysis: adding a few ads to a large analyzed corpus.
+
+Builds a synthetic corpus by sampling words from the real OCR text in
+collected_ads_enriched.csv, analyzes it from scratch into a temporary
+analysis store, then adds new ads and times the incremental run (sentiment
+and top words for the new ads only, TF-IDF transform or refit depending on
+vocabulary drift). The store's term counts are checked against a recount
+from scratch afterwards. Network connections are refused for the whole run,
+so the analysis can't download anything on first use.
+
+Run from the project root:
+    python benchmarks/bench_nlp_incremental.py [n_docs] [n_new]
+"""
+
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nlp'))
+
+import pandas as pd
+
+from analysis_store import AnalysisStore
+from analyze_image_text import INPUT_CSV, analyze, make_vectorizer
+
+N_DOCS = 50_000
+N_NEW = 200
+SEED = 0
+
+
+def synthetic_docs(n_docs: int, rng: random.Random) -> list[str]:
+    texts = pd.read_csv(INPUT_CSV, usecols=['ocr_text'])['ocr_text'].dropna().astype(str)
+    words = ' '.join(texts).split()
+    lengths = [len(t.split()) for t in texts]
+    return [' '.join(rng.choices(words, k=rng.choice(lengths))) for _ in range(n_docs)]
+
+
+def block_network():
+    def refuse(*args, **kwargs):
+        raise OSError('network access is blocked in this benchmark')
+
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+
+
+def main() -> int:
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else N_DOCS
+    n_new = int(sys.argv[2]) if len(sys.argv) > 2 else N_NEW
+    block_network()
+    rng = random.Random(SEED)
+    texts = synthetic_docs(n_docs + n_new, rng)
+    ad_ids = list(range(len(texts)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalysisStore(os.path.join(tmp, 'analysis.sqlite'))
+
+        t0 = time.perf_counter()
+        analyze(ad_ids[:n_docs], texts[:n_docs], store)
+        full_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        rows = analyze(ad_ids, texts, store)
+        incremental_s = time.perf_counter() - t0
+
+        analyzer = make_vectorizer().build_analyzer()
+        tf, df = Counter(), Counter()
+        for text in texts:
+            terms = Counter(analyzer(text))
+            tf.update(terms)
+            df.update(terms.keys())
+        stored = {t: (a, b) for t, a, b in store.conn.execute('SELECT term, tf, df FROM terms')}
+        counts_ok = stored == {t: (tf[t], df[t]) for t in tf}
+        store.close()
+
+    print(f"\n{n_docs} docs from scratch:   {full_s:8.2f} s")
+    print(f"+{n_new} docs incremental: {incremental_s:8.2f} s ({full_s / incremental_s:.0f}x faster)")
+    print(f"rows: {len(rows)}, term counts match a recount: {counts_ok}")
+    return 0 if counts_ok and len(rows) == len(texts) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+'''
+Accuracy and speed of the numpy palette engine against ColorThief(quality = 1)
+on a random sample of collected_ads.csv.
+
+For each image both engines run on the same decoded image and we report
+  - exact match rate of dominant_color_1..5 (same slot, same hex)
+  - mean RGB distance of dominant_color_1
+  - mean RGB distance per color after optimally matching the two palettes
+  - seconds per image for each engine
+
+Run from the project root:
+    python benchmarks/bench_palette_accuracy.py [n_images] [pixel_budget]
+'''
+
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+import palette
+
+INPUT_CSV = 'collected_ads.csv'
+N_IMAGES = 100
+SEED = 42
+
+
+def hex_to_rgb(h):
+    return np.array([int(h[i:i + 2], 16) for i in (1, 3, 5)], dtype = float)
+
+
+def matched_distance(a, b):
+    ''' Mean RGB distance between two palettes under the best one-to-one pairing'''
+    a = [hex_to_rgb(c) for c in a]
+    b = [hex_to_rgb(c) for c in b]
+    n = min(len(a), len(b))
+    if n == 0: return float('nan')
+    best = min(
+        sum(np.linalg.norm(a[i] - b[j]) for i, j in zip(range(n), perm))
+        for perm in itertools.permutations(range(len(b)), n)
+    )
+    return best / n
+
+
+def sample_paths(n):
+    with open(INPUT_CSV, 'r', encoding = 'utf-8') as f:
+        paths = [r['image_path'] for r in csv.DictReader(f) if os.path.exists(r['image_path'])]
+    random.Random(SEED).shuffle(paths)
+    return paths[:n]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_IMAGES
+    helpers.PALETTE_PIXEL_BUDGET = int(sys.argv[2]) if len(sys.argv) > 2 else palette.DEFAULT_PIXEL_BUDGET
+
+    paths = sample_paths(n)
+    if not paths: sys.exit(f'No images found from {INPUT_CSV}')
+
+    slot_hits, first_dist, matched, t_ref, t_np = 0, [], [], 0.0, 0.0
+    for p in paths:
+        img = helpers.load_image(p)
+        ref, dt = timed(helpers.get_dominant_colors, img, 5, engine = 'colorthief')
+        t_ref += dt
+        new, dt = timed(helpers.get_dominant_colors, img, 5, engine = 'numpy')
+        t_np += dt
+
+        slot_hits += sum(1 for a, b in zip(ref, new) if a == b)
+        if ref and new: first_dist.append(np.linalg.norm(hex_to_rgb(ref[0]) - hex_to_rgb(new[0])))
+        matched.append(matched_distance(ref, new))
+
+    print(f'{len(paths)} images, pixel budget {helpers.PALETTE_PIXEL_BUDGET}')
+    print(f'exact slot match          {slot_hits / (5 * len(paths)):.1%}')
+    print(f'dominant_color_1 distance {np.mean(first_dist):.2f} (RGB units, max 441)')
+    print(f'matched palette distance  {np.nanmean(matched):.2f}')
+    print(f'colorthief {t_ref / len(paths) * 1000:8.1f} ms/img')
+    print(f'numpy      {t_np / len(paths) * 1000:8.1f} ms/img ({t_ref / t_np:.1f}x)')
@@ -0,0 +1,75 @@
+'''
+Images per second of helpers.process_image before/after the single-decode path.
+
+before    : verify(), OCR and ColorThief each open and decode the file on their own
+after     : read + decode once, both stages share the decoded image (default
+            palette engine), feature cache off
+cache cold: the same with a fresh, empty feature cache (misses + writes)
+cache warm: a second pass over that cache (hits only: no OCR, no palette)
+
+The feature cache is a temporary file, so reruns never time hits on
+feature_cache.sqlite.
+
+Run from the project root:
+    python benchmarks/bench_process_image.py [n_images]
+'''
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import helpers
+
+INPUT_CSV = 'collected_ads.csv'
+N_IMAGES = 50
+
+
+def process_image_triple_open(image_path):
+    ''' The pre single-decode pipeline: three opens / decodes per image'''
+    Image.open(image_path).verify()
+    helpers.extract_ocr_and_layout(image_path)
+    helpers.get_dominant_colors(image_path, n_colors = 5, engine = 'colorthief')
+
+
+def sample_paths(n):
+    paths = []
+    with open(INPUT_CSV, 'r', encoding = 'utf-8') as f:
+        for row in csv.DictReader(f):
+            if os.path.exists(row['image_path']): paths.append(row['image_path'])
+            if len(paths) >= n: break
+    return paths
+
+
+def images_per_second(fn, paths):
+    start = time.perf_counter()
+    for p in paths: fn(p)
+    return len(paths) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_IMAGES
+    paths = sample_paths(n)
+    if not paths: sys.exit(f'No images found from {INPUT_CSV}')
+
+    # warm the page cache so both variants read from memory
+    for p in paths:
+        with open(p, 'rb') as f: f.read()
+
+    helpers.FEATURE_CACHE_PATH = None
+    before = images_per_second(process_image_triple_open, paths)
+    after = images_per_second(helpers.process_image, paths)
+    with tempfile.TemporaryDirectory() as tmp:
+        helpers.FEATURE_CACHE_PATH = os.path.join(tmp, 'feature_cache.sqlite')
+        cold = images_per_second(helpers.process_image, paths)
+        warm = images_per_second(helpers.process_image, paths)
+        helpers.get_feature_cache().close()
+    print(f'{len(paths)} images')
+    print(f'before (triple open, colorthief) {before:8.2f} img/s')
+    print(f'after  (single decode, no cache) {after:8.2f} img/s  {after / before:.2f}x')
+    print(f'after  (cold feature cache)      {cold:8.2f} img/s  {cold / before:.2f}x')
+    print(f'after  (warm feature cache)      {warm:8.2f} img/s  {warm / before:.2f}x')
@@ -0,0 +1,77 @@
+'''
+Speed and word recall of OCR_MODE = 'roi' against full-image OCR.
+
+Reference words are the ocr_text already stored in collected_ads_enriched.csv
+(full-image OCR). For a sample of ads with text, both modes run on the same
+decoded image. The script reports
+  - ms/image for each mode
+  - word recall of each mode against the stored ocr_text (multiset overlap)
+  - mean |text_image_ratio| difference from the stored value
+
+Run from the project root:
+    python benchmarks/bench_roi_ocr.py [n_images]
+'''
+
+import csv
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+
+ENRICHED_CSV = 'collected_ads_enriched.csv'
+N_IMAGES = 100
+MIN_WORDS = 3
+SEED = 42
+
+
+def recall(found, reference):
+    ref = Counter(w.lower() for w in reference.split())
+    got = Counter(w.lower() for w in found.split())
+    total = sum(ref.values())
+    return sum((ref & got).values()) / total if total else 1.0
+
+
+def sample_rows(n):
+    with open(ENRICHED_CSV, 'r', encoding = 'utf-8') as f:
+        rows = [
+            r for r in csv.DictReader(f)
+            if r['extraction_status'] == 'success'
+            and int(r['ocr_word_count'] or 0) >= MIN_WORDS
+            and os.path.exists(r['image_path'])
+        ]
+    random.Random(SEED).shuffle(rows)
+    return rows[:n]
+
+
+def run(img, mode):
+    rgb = helpers.to_rgb(img)
+    start = time.perf_counter()
+    data = helpers.run_ocr(rgb, mode = mode)
+    seconds = time.perf_counter() - start
+    return helpers.summarize_ocr(data, rgb.size[0], rgb.size[1], img.format), seconds
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_IMAGES
+    rows = sample_rows(n)
+    if not rows: sys.exit(f'No ads with text found in {ENRICHED_CSV}')
+
+    totals = {m: {'seconds': 0.0, 'recall': 0.0, 'ratio_diff': 0.0} for m in ('full', 'roi')}
+    for row in rows:
+        img = helpers.load_image(row['image_path'])
+        for mode, acc in totals.items():
+            out, seconds = run(img, mode)
+            acc['seconds'] += seconds
+            acc['recall'] += recall(out['ocr_text'], row['ocr_text'])
+            acc['ratio_diff'] += abs(out['text_image_ratio'] - float(row['text_image_ratio']))
+
+    print(f'{len(rows)} ads with >= {MIN_WORDS} stored OCR words')
+    print(f'{"mode":>5} {"ms/img":>8} {"recall":>7} {"|d ratio|":>10}')
+    for mode, acc in totals.items():
+        print(f'{mode:>5} {acc["seconds"] / len(rows) * 1000:>8.1f} {acc["recall"] / len(rows):>7.1%} {acc["ratio_diff"] / len(rows):>10.4f}')
+    print(f'speedup {totals["full"]["seconds"] / totals["roi"]["seconds"]:.2f}x')
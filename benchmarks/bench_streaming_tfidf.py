@@ -0,0 +1,102 @@
+"""
+Peak memory and time: streaming TF-IDF keywords vs the in-memory path.
+
+Writes a synthetic enriched CSV (real OCR words resampled, plus a palette
+JSON column of realistic size, since that is what makes the full read heavy)
+and runs each mode in a fresh child process, which reports its own peak RSS:
+  memory  pd.read_csv of the whole file + one TfidfVectorizer fit_transform
+  stream  nlp/streaming_tfidf.stream_keywords (two chunked passes)
+Both outputs are checked to be identical.
+
+Run from the project root:
+    python benchmarks/bench_streaming_tfidf.py [n_ads ...]
+"""
+
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'nlp'))
+
+SIZES = [20_000, 100_000, 300_000]
+CHUNK_SIZE = 5000
+SEED = 0
+
+
+def write_corpus(path: str, n_ads: int):
+    import pandas as pd
+
+    source = pd.read_csv(os.path.join(ROOT, 'collected_ads_enriched.csv'), usecols=['ocr_text', 'color_palette_json'])
+    words = ' '.join(source['ocr_text'].dropna().astype(str)).split()
+    palettes = source['color_palette_json'].dropna().tolist()
+    rng = random.Random(SEED)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ad_id', 'competitor', 'ocr_text', 'ocr_word_count', 'color_palette_json'])
+        for ad_id in range(n_ads):
+            n_words = rng.randint(0, 60)
+            text = ' '.join(rng.choices(words, k=n_words))
+            writer.writerow([ad_id, 'synthetic', text, n_words, rng.choice(palettes)])
+
+
+def run_mode(mode: str, input_csv: str, output_csv: str):
+    """Child process body: run one mode, print seconds and peak RSS as JSON."""
+    t0 = time.perf_counter()
+    if mode == 'stream':
+        from streaming_tfidf import stream_keywords
+
+        stream_keywords(input_csv, output_csv, CHUNK_SIZE)
+    else:
+        import pandas as pd
+        from analyze_image_text import MIN_WORDS, keywords_from_tfidf, make_vectorizer
+
+        df = pd.read_csv(input_csv)
+        df = df[df['ocr_text'].notna() & (df['ocr_word_count'] >= MIN_WORDS)]
+        texts = df['ocr_text'].astype(str).tolist()
+        vec = make_vectorizer()
+        keywords = keywords_from_tfidf(vec.fit_transform(texts), vec, texts)
+        pd.DataFrame({
+            'ad_id': df['ad_id'], 'top_keywords': ['|'.join(k) for k in keywords],
+        }).to_csv(output_csv, index=False)
+    seconds = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak_mb}))
+
+
+def measure(mode: str, input_csv: str, output_csv: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, __file__, '--child', mode, input_csv, output_csv],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'ads':>8} {'file MB':>8} {'mode':>7} {'seconds':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_ads in sizes:
+            corpus = os.path.join(tmp, 'ads.csv')
+            write_corpus(corpus, n_ads)
+            file_mb = os.path.getsize(corpus) / 2**20
+            outputs = {}
+            for mode in ('memory', 'stream'):
+                outputs[mode] = os.path.join(tmp, f'{mode}.csv')
+                r = measure(mode, corpus, outputs[mode])
+                print(f"{n_ads:>8} {file_mb:>8.0f} {mode:>7} {r['seconds']:>8.2f} {r['peak_mb']:>8.0f}")
+            with open(outputs['memory']) as a, open(outputs['stream']) as b:
+                assert a.read() == b.read(), 'streaming keywords differ from the in-memory result'
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        run_mode(*sys.argv[2:5])
+    else:
+        main()
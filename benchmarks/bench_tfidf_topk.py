@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: top-k TF-IDF keywords, per-row dense loop vs sparse top_k_per_row.
+
+Synthetic corpora of 4k, 40k and 400k documents (Zipf-distributed words,
+5-40 per document) go through the same TfidfVectorizer(max_features=500) as
+nlp/analyze_image_text.py. The dense baseline is the old loop
+(toarray + argsort per row, with a stable sort so ties are well defined).
+Both results are checked to be identical.
+
+Run from the project root:
+    python benchmarks/bench_tfidf_topk.py [n_docs ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nlp'))
+
+from analyze_image_text import top_k_per_row
+
+SIZES = [4_000, 40_000, 400_000]
+VOCAB = 5_000
+TOP_K = 3
+SEED = 0
+
+
+def synthetic_docs(n_docs: int, rng) -> list[str]:
+    words = np.array([f'w{i}' for i in range(VOCAB)])
+    lengths = rng.integers(5, 41, n_docs)
+    ids = np.minimum(rng.zipf(1.3, lengths.sum()) - 1, VOCAB - 1)
+    chunks = np.split(words[ids], np.cumsum(lengths)[:-1])
+    return [' '.join(c) for c in chunks]
+
+
+def dense_top_k(tfidf, k: int) -> np.ndarray:
+    out = np.full((tfidf.shape[0], k), -1, dtype=np.int64)
+    for idx in range(tfidf.shape[0]):
+        row = tfidf[idx].toarray().flatten()
+        top = row.argsort(kind='stable')[-k:][::-1]
+        top = top[row[top] > 0]
+        out[idx, :len(top)] = top
+    return out
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    rng = np.random.default_rng(SEED)
+    print(f'{"docs":>8} {"dense s":>9} {"sparse s":>9} {"speedup":>8} {"identical":>9}')
+    for n in sizes:
+        tfidf = TfidfVectorizer(max_features=500).fit_transform(synthetic_docs(n, rng))
+        dense, t_dense = timed(dense_top_k, tfidf, TOP_K)
+        sparse, t_sparse = timed(top_k_per_row, tfidf, TOP_K)
+        same = np.array_equal(dense, sparse)
+        print(f'{n:>8} {t_dense:>9.3f} {t_sparse:>9.3f} {t_dense / t_sparse:>7.1f}x {str(same):>9}')
@@ -0,0 +1,136 @@
+'''
+Optional columnar (Parquet) copies of the pipeline's CSV hand-offs.
+
+Every stage still writes its CSV. When pyarrow is installed, the writer also
+converts the CSV to a Parquet file next to it (write_copy), and the pandas
+readers go through read_frame / iter_frames, which take the Parquet copy
+whenever it was converted from the CSV as it is now:
+- only the requested columns are read (column projection)
+- the file is memory-mapped instead of parsed
+- the '|'-joined multi-valued fields (categories, sentiments, objects) are
+  list<string> columns, split once at conversion
+Without pyarrow, with ENABLED off, or when the copy is missing or older than
+the CSV, everything falls back to reading the CSV.
+
+Column types are the ones pandas infers from the CSV, so a Parquet read gives
+the same frame as pd.read_csv with usecols.
+
+data_store.py keeps reading the CSV: it needs every column as Python row
+dicts, and building those from Parquet is no faster than csv.DictReader.
+'''
+
+import os
+
+
+ENABLED = True  # write and read Parquet copies (only if pyarrow is installed)
+LIST_COLUMNS = ('all_categories', 'all_categories_full', 'all_sentiments', 'all_sentiments_full', 'objects_symbols')
+LIST_SEP = '|'
+FINGERPRINT_KEY = b'source_csv'  # Parquet metadata: fingerprint of the CSV it was converted from
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def available():
+    return ENABLED and _arrow() is not None
+
+
+def parquet_path(csv_path):
+    ''' 'collected_ads_enriched.csv' -> 'collected_ads_enriched.parquet' '''
+    return os.path.splitext(str(csv_path))[0] + '.parquet'
+
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+def current_copy(csv_path):
+    ''' Path of the Parquet copy of csv_path if it is usable and up to date, else None'''
+    path = parquet_path(csv_path)
+    if not available() or not os.path.exists(path): return None
+    if not os.path.exists(csv_path): return path
+    metadata = _arrow().parquet.read_schema(path, memory_map = True).metadata or {}
+    return path if metadata.get(FINGERPRINT_KEY) == file_fingerprint(csv_path).encode() else None
+
+
+def write_copy(csv_path):
+    '''
+    Converts csv_path to its Parquet copy (no-op without pyarrow).
+    Returns the Parquet path, or None if nothing was written
+    '''
+    if not available(): return None
+    import pandas as pd
+    pa = _arrow()
+
+    df = pd.read_csv(csv_path)
+    arrays, fields = [], []
+    for col in df.columns:
+        if col in LIST_COLUMNS:
+            values = [v.split(LIST_SEP) if isinstance(v, str) and v else [] for v in df[col]]
+            array = pa.array(values, type = pa.list_(pa.string()))
+        else:
+            array = pa.Array.from_pandas(df[col])
+        arrays.append(array)
+        fields.append(pa.field(col, array.type))
+    table = pa.Table.from_arrays(arrays, schema = pa.schema(fields))
+    table = table.replace_schema_metadata({FINGERPRINT_KEY: file_fingerprint(csv_path)})
+
+    path = parquet_path(csv_path)
+    tmp = path + '.tmp'
+    pa.parquet.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _joined(table):
+    ''' table with LIST_COLUMNS back as '|'-joined strings, null when empty (joined in Arrow)'''
+    pa = _arrow()
+    import pyarrow.compute as pc
+    for col in LIST_COLUMNS:
+        i = table.schema.get_field_index(col)
+        if i < 0: continue
+        values = table.column(i)
+        joined = pc.if_else(
+            pc.equal(pc.list_value_length(values), 0),
+            pa.scalar(None, pa.string()), pc.binary_join(values, LIST_SEP)
+        )
+        table = table.set_column(i, col, joined)
+    return table
+
+
+def _to_frame(table, lists):
+    if not lists: table = _joined(table)  # the CSV representation ('' reads as NaN there)
+    # columns are handed to pandas one by one, freeing the Arrow buffers as they go
+    return table.to_pandas(split_blocks = True, self_destruct = True)
+
+
+def read_frame(csv_path, columns = None, lists = False):
+    '''
+    pd.read_csv(csv_path, usecols = columns), from the Parquet copy when it is current.
+    lists: keep LIST_COLUMNS as lists (Parquet copy only) instead of '|'-joined strings
+    '''
+    path = current_copy(csv_path)
+    if path is None:
+        import pandas as pd
+        return pd.read_csv(csv_path, usecols = columns)
+    return _to_frame(_arrow().parquet.read_table(path, columns = columns, memory_map = True), lists)
+
+
+def iter_frames(csv_path, columns = None, chunk_size = 5000):
+    ''' read_frame() in chunks of chunk_size rows'''
+    path = current_copy(csv_path)
+    if path is None:
+        import pandas as pd
+        yield from pd.read_csv(csv_path, usecols = columns, chunksize = chunk_size)
+        return
+    pa = _arrow()
+    reader = pa.parquet.ParquetFile(path, memory_map = True)
+    for batch in reader.iter_batches(batch_size = chunk_size, columns = columns):
+        yield _to_frame(pa.Table.from_batches([batch]), False)
@@ -5,20 +5,26 @@
 
 
 '''
-Reads Pitt Ads JSON annotations, filters to '10/' folder images,
-cross-references topics/sentiments, assigns competitor labels,
+Reads Pitt Ads JSON annotations for the selected image folders ('10/' by
+default), cross-references topics/sentiments, assigns competitor labels,
 and outputs a master CSV ready for DB ingestion.
+Annotations are read through an on-disk index (annotation_index.py), so only
+the selected folders' keys are parsed after the first run.
+Folders are collected in parallel, one pool task per folder, and merged in
+folder order into one CSV (or one CSV per folder).
 '''
 
 
 # In[62]:
 
 
-import json
 import os
 import csv
 import re
-from collections import defaultdict
+from multiprocessing import Pool
+
+import instrumentation
+from annotation_index import AnnotationIndex, load_annotations
 
 
 # In[63]:
@@ -26,13 +32,20 @@ from collections import defaultdict
 
 # CONFIGURE PATHS 
 BASE_DIR = '.'
-IMAGE_DIR = os.path.join(BASE_DIR,'10')
+FOLDERS = ['10']  # image folders (annotation key prefixes) to collect, None for all
 SYMBOLS_JSON = os.path.join(BASE_DIR,'Symbols.json')
 TOPICS_JSON = os.path.join(BASE_DIR,'Topics.json')
 SENTIMENTS_JSON = os.path.join(BASE_DIR,'Sentiments.json')
 TOPICS_LIST = os.path.join(BASE_DIR,'Topics_List.txt')
 SENTIMENTS_LIST = os.path.join(BASE_DIR,'Sentiments_List.txt')
 OUTPUT_CSV = './collected_ads.csv'
+ANNOTATION_INDEX = os.path.join(BASE_DIR,'annotations_index.sqlite')
+ANNOTATION_SOURCES = {'symbols': SYMBOLS_JSON, 'topics': TOPICS_JSON, 'sentiments': SENTIMENTS_JSON}
+COLLECT_WORKERS = None     # None: one worker per available core (at most one per folder)
+SHARD_OUTPUT = False       # one CSV per folder instead of OUTPUT_CSV
+SHARD_CSV = './collected_ads_{folder}.csv'
+RECORD_IMAGE_STAT = False  # add image_size/image_mtime columns (lets extraction spot changed images)
+MISSING_EXAMPLES = 5       # missing image keys listed per folder in the summary
 
 
 # In[64]:
@@ -82,51 +95,94 @@ def load_sentiments_list(path):
 # In[67]:
 
 
+# INDEX IMAGE FOLDERS
+def scan_image_folder(folder, with_stat = False):
+    '''
+    One os.scandir pass over BASE_DIR/folder instead of one stat per key
+    Returns {basename: (path, size, mtime_ns)}, size/mtime None unless with_stat
+    '''
+    index = {}
+    try:
+        entries = os.scandir(os.path.join(BASE_DIR, folder))
+    except FileNotFoundError:
+        return index
+    with entries:
+        for entry in entries:
+            if not entry.is_file(): continue
+            size = mtime = None
+            if with_stat:
+                st = entry.stat()
+                size, mtime = st.st_size, st.st_mtime_ns
+            index[entry.name] = (os.path.join(BASE_DIR, folder, entry.name), size, mtime)
+    return index
+
+def build_image_index(folders, with_stat = False):
+    ''' {folder: {basename: (path, size, mtime_ns)}}'''
+    return {folder: scan_image_folder(folder, with_stat) for folder in folders}
+
+
+# In[ ]:
+
+
 # RESOLVE IMAGE PATH
-def resolve_image_path(json_key):
+def resolve_image_path(json_key, image_index = None):
     '''
     json_key examples: '10/170741.png', '10/170489.jpg'
-    Returns absolute image path
+    Returns the image path inside the key's folder
+    image_index: build_image_index() output; without it the file is checked on disk
     '''
-    filename = os.path.basename(json_key)
-    full_path = os.path.join(IMAGE_DIR, filename)
+    folder, filename = os.path.split(json_key)
+    if image_index is not None:
+        found = image_index.get(folder, {}).get(filename)
+        return found[0] if found else None
+    full_path = os.path.join(BASE_DIR, folder, filename)
     if os.path.exists(full_path): return full_path
     return None
 
 
-# In[68]:
-
+# In[69]:
 
-topics_meta = load_topics_list(TOPICS_LIST)
-topics_meta['2']
 
+# PER-FOLDER COLLECTION (one pool task per image folder)
+_lookups = None  # (topics_meta, sentiments_meta), parsed once by collect() and handed to each worker
 
-# In[69]:
+def available_cores():
+    ''' Cores this process may run on (respects taskset / container cpusets)'''
+    try: return len(os.sched_getaffinity(0))
+    except AttributeError: return os.cpu_count() or 1
 
+def init_worker(topics_meta, sentiments_meta):
+    global _lookups
+    _lookups = (topics_meta, sentiments_meta)
 
-# MAIN COLLECTION LOGIC
-def collect():
-    print('Loading files..')
-    topics_meta = load_topics_list(TOPICS_LIST)
-    sentiments_meta = load_sentiments_list(SENTIMENTS_LIST)
+def collect_folder(folder):
+    '''
+    Builds the records of one image folder, in annotation file order
+    Returns (folder, number of keys, records, keys without an image)
+    '''
+    topics_meta, sentiments_meta = _lookups
 
-    with open(SYMBOLS_JSON, 'r') as f: symbols_data = json.load(f)
-    with open(TOPICS_JSON, 'r') as f: topics_data = json.load(f)
-    with open(SENTIMENTS_JSON, 'r') as f: sentiments_data = json.load(f)
+    # only this folder's annotations are parsed
+    with instrumentation.timer('annotations.load'):
+        annotations = load_annotations(ANNOTATION_SOURCES, [folder], ANNOTATION_INDEX)
+    symbols_data = annotations['symbols']
+    topics_data = annotations['topics']
+    sentiments_data = annotations['sentiments']
 
-    # using only '10/' folder only
-    desired_keys = [k for k in symbols_data if k.startswith('10/')]
-    print(f'Images found in "10/" folder is {len(desired_keys)}')
+    # one directory scan instead of a stat per key
+    with instrumentation.timer('os.scandir'):
+        image_index = build_image_index([folder], RECORD_IMAGE_STAT)
+    missing = []
 
     records = []
     # obj_records = []
 
-    for key in desired_keys:
+    for key in symbols_data:
         # category resolution
         raw_topics = topics_data.get(key,[])
 
-        # deduplicate
-        unique_topics = list(set(raw_topics))
+        # deduplicate, keeping the annotators' order (a set's order changes between processes)
+        unique_topics = list(dict.fromkeys(raw_topics))
 
         # skip the excluded category
         non_unclear = [t for t in unique_topics if t!=EXCLUDED_TOPIC]
@@ -138,12 +194,12 @@ def collect():
         raw_sents = sentiments_data.get(key,[])
         sents = []
         for s in raw_sents: sents.extend(s)
-        unique_sents = list(set(sents))
+        unique_sents = list(dict.fromkeys(sents))
 
         # image path
-        image_path = resolve_image_path(key)
+        image_path = resolve_image_path(key, image_index)
         if image_path is None:
-            print(f'No image of {key} found in image folder')
+            missing.append(key)
             continue
         # build ad_id
         ad_id = os.path.splitext(os.path.basename(key))[0]
@@ -168,7 +224,7 @@ def collect():
 
 
         # records
-        records.append({
+        record = {
             'ad_id':ad_id,
             'json_key':key,
             'image_path':image_path,
@@ -178,18 +234,81 @@ def collect():
             'all_sentiments':'|'.join(sentiment_abbr),
             'all_sentiments_full': '|'.join(sentiment_full),
             'objects_symbols': '|'.join(obj)
-        })
+        }
+        if RECORD_IMAGE_STAT:
+            _, record['image_size'], record['image_mtime'] = image_index[folder][os.path.basename(key)]
+        records.append(record)
 
-    # writing csv 
-    if records:
-        cols = records[0].keys()
-        with open(OUTPUT_CSV, 'w', newline = '', encoding = 'utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames = cols)
-            writer.writeheader()
-            writer.writerows(records)
-        print(f'collected_ads.csv has {len(records)} ads')
+    instrumentation.flush()  # pool workers are not told when the pool ends
+    return folder, len(symbols_data), records, missing
+
+
+# In[ ]:
+
+
+def write_records(path, records):
+    cols = records[0].keys()
+    with open(path, 'w', newline = '', encoding = 'utf-8') as f, instrumentation.timer('csv.write'):
+        writer = csv.DictWriter(f, fieldnames = cols)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+# In[ ]:
+
+
+# MAIN COLLECTION LOGIC
+def collect(folders = FOLDERS, num_workers = COLLECT_WORKERS, shard = SHARD_OUTPUT):
+    '''
+    folders: image folders to collect, None for every folder in the annotations
+    num_workers: pool size, None for one per available core (at most one per folder)
+    shard: write one CSV per folder (SHARD_CSV) instead of OUTPUT_CSV
+
+    Folders are collected in parallel and merged in the order of folders,
+    so the output does not depend on which worker finishes first.
+    Returns the merged records
+    '''
+    print('Loading files..')
+    topics_meta = load_topics_list(TOPICS_LIST)
+    sentiments_meta = load_sentiments_list(SENTIMENTS_LIST)
+
+    # index changed annotation files once, before the workers read from the index
+    index = AnnotationIndex(ANNOTATION_INDEX)
+    try:
+        for name, json_path in ANNOTATION_SOURCES.items(): index.ensure(name, json_path)
+        if folders is None: folders = sorted(index.folders('symbols'))
+    finally:
+        index.close()
+    folders = list(folders)
+
+    workers = min(num_workers or available_cores(), len(folders)) or 1
+    if workers > 1:
+        with Pool(processes = workers, initializer = init_worker, initargs = (topics_meta, sentiments_meta)) as pool:
+            results = pool.map(collect_folder, folders, chunksize = 1)
     else:
+        init_worker(topics_meta, sentiments_meta)
+        results = [collect_folder(folder) for folder in folders]
+
+    records = []
+    for folder, n_keys, folder_records, missing in results:
+        print(f'Images found in "{folder}/" folder is {n_keys}')
+        # missing images, one line per folder
+        if missing:
+            examples = ', '.join(missing[:MISSING_EXAMPLES])
+            more = f' (+{len(missing) - MISSING_EXAMPLES} more)' if len(missing) > MISSING_EXAMPLES else ''
+            print(f'No image found for {len(missing)} keys in "{folder}/" folder: {examples}{more}')
+        if shard and folder_records:
+            write_records(SHARD_CSV.format(folder = folder), folder_records)
+        records.extend(folder_records)
+
+    # writing csv 
+    if not records:
         print('No records collected')
+    elif shard:
+        print(f'{len(records)} ads written to {SHARD_CSV.format(folder = "<folder>")}')
+    else:
+        write_records(OUTPUT_CSV, records)
+        print(f'collected_ads.csv has {len(records)} ads')
 
     return records
 
@@ -204,7 +323,7 @@ def collect():
 
 
 if __name__=='__main__':
-    collect()
+    instrumentation.run_stage('collect', collect)
 
 
 # In[ ]:
@@ -7,6 +7,11 @@
 import sqlite3
 import csv
 import os
+import time
+import hashlib
+from contextlib import contextmanager
+
+import instrumentation
 
 
 # In[11]:
@@ -16,6 +21,147 @@ DB_PATH = 'ads.sqlite'
 ADS_CSV = 'collected_ads_enriched.csv'
 
 
+# In[ ]:
+
+
+# SCHEMA
+# Each migration takes the database from version-1 to version (PRAGMA user_version)
+MIGRATIONS = {
+    1: '''
+    CREATE TABLE IF NOT EXISTS ads (
+    ad_id TEXT PRIMARY KEY,
+    json_key TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    competitor TEXT NOT NULL,
+    objects_symbols TEXT,
+    image_width INTEGER,
+    image_height INTEGER,
+    image_format TEXT,
+    ocr_text TEXT,
+    ocr_word_count INTEGER,
+    ocr_confidence_avg REAL,
+    text_area_px INTEGER,
+    image_area_px INTEGER,
+    text_image_ratio REAL,
+    layout_type TEXT,
+    dominant_color_1 TEXT,
+    dominant_color_2 TEXT,
+    dominant_color_3 TEXT,
+    dominant_color_4 TEXT,
+    dominant_color_5 TEXT,
+    color_palette_json TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS ads_categories (
+    ad_id TEXT NOT NULL REFERENCES ads(ad_id) ON DELETE CASCADE,
+    category_abbr TEXT NOT NULL,
+    category_full TEXT,
+    is_primary INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ad_id, category_abbr)
+    );
+
+    CREATE TABLE IF NOT EXISTS ads_sentiments (
+    ad_id TEXT NOT NULL REFERENCES ads(ad_id) ON DELETE CASCADE,
+    sentiment_abbr TEXT NOT NULL,
+    sentiment_full TEXT,
+    PRIMARY KEY (ad_id, sentiment_abbr)
+    );
+
+    -- covering indexes for the dashboard GROUP BYs and category/sentiment -> ad joins;
+    -- ad_id lookups on the child tables use their primary keys
+    CREATE INDEX IF NOT EXISTS idx_ads_competitor ON ads(competitor);
+    CREATE INDEX IF NOT EXISTS idx_ads_layout_type ON ads(layout_type);
+    CREATE INDEX IF NOT EXISTS idx_ads_categories_abbr ON ads_categories(category_abbr, ad_id);
+    CREATE INDEX IF NOT EXISTS idx_ads_sentiments_abbr ON ads_sentiments(sentiment_abbr, ad_id);
+    ''',
+    # hash of the ad row + its categories/sentiments, for incremental sync
+    2: '''
+    ALTER TABLE ads ADD COLUMN content_hash TEXT;
+    ''',
+    # strategy label and the version of the strategy model that assigned it
+    3: '''
+    ALTER TABLE ads ADD COLUMN strategy TEXT;
+    ALTER TABLE ads ADD COLUMN strategy_model TEXT;
+    CREATE INDEX IF NOT EXISTS idx_ads_strategy ON ads(strategy);
+    '''
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    '''
+    Applies pending migrations in order, each in its own transaction.
+    Returns the list of versions applied
+    '''
+    applied = []
+    for version in range(schema_version(conn) + 1, SCHEMA_VERSION + 1):
+        conn.executescript(f'BEGIN; {MIGRATIONS[version]}; PRAGMA user_version = {version}; COMMIT;')
+        applied.append(version)
+    return applied
+
+def connect(path = DB_PATH):
+    ''' Opens (creating if needed) the ads database at the current schema version'''
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    applied = migrate(conn)
+    if applied: print(f'Schema migrated to version {applied[-1]}')
+    return conn
+
+
+# In[ ]:
+
+
+# QUERY PLAN CHECKS
+# dashboard query -> (sql, params, indexes the plan must use)
+DASHBOARD_QUERIES = {
+    'ads_per_competitor': (
+        'SELECT competitor, COUNT(*) AS n FROM ads GROUP BY competitor ORDER BY n DESC',
+        (), ['idx_ads_competitor']
+    ),
+    'ads_per_layout': (
+        'SELECT layout_type, COUNT(*) AS n FROM ads GROUP BY layout_type ORDER BY n DESC',
+        (), ['idx_ads_layout_type']
+    ),
+    'top_categories': (
+        'SELECT category_abbr, COUNT(*) AS n FROM ads_categories GROUP BY category_abbr ORDER BY n DESC LIMIT 8',
+        (), ['idx_ads_categories_abbr']
+    ),
+    'top_sentiments': (
+        'SELECT sentiment_abbr, COUNT(*) AS n FROM ads_sentiments GROUP BY sentiment_abbr ORDER BY n DESC LIMIT 8',
+        (), ['idx_ads_sentiments_abbr']
+    ),
+    'ads_in_category': (
+        '''SELECT a.ad_id, a.competitor, a.layout_type FROM ads_categories c
+        JOIN ads a ON a.ad_id = c.ad_id WHERE c.category_abbr = ?''',
+        ('chocolate',), ['idx_ads_categories_abbr', 'sqlite_autoindex_ads_1']
+    ),
+    'ads_per_strategy': (
+        'SELECT strategy, COUNT(*) AS n FROM ads GROUP BY strategy ORDER BY n DESC',
+        (), ['idx_ads_strategy']
+    ),
+    'sentiments_of_competitor': (
+        '''SELECT s.sentiment_abbr, COUNT(*) AS n FROM ads a
+        JOIN ads_sentiments s ON s.ad_id = a.ad_id WHERE a.competitor = ?
+        GROUP BY s.sentiment_abbr''',
+        ('chocolate',), ['idx_ads_competitor', 'sqlite_autoindex_ads_sentiments_1']
+    )
+}
+
+def check_query_plans(conn, queries = DASHBOARD_QUERIES):
+    '''
+    EXPLAIN QUERY PLAN for each dashboard query.
+    Returns {name: (uses expected indexes, plan text)}
+    '''
+    results = {}
+    for name, (sql, params, indexes) in queries.items():
+        plan = ' | '.join(r[-1] for r in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+        results[name] = (all(idx in plan for idx in indexes), plan)
+    return results
+
+
 # In[12]:
 
 
@@ -23,113 +169,261 @@ def read_csv(path):
     if not os.path.exists(path):
         print(f'CSV not found {path}')
         return []
-    with open(path, 'r', encoding = 'utf-8') as f:
+    with open(path, 'r', encoding = 'utf-8') as f, instrumentation.timer('csv.read'):
         return list(csv.DictReader(f))
 
 
+# In[ ]:
+
+
+# BULK LOAD SETTINGS
+BATCH_SIZE = 5000                # rows per executemany call
+LOAD_PRAGMAS = {
+    'synchronous': 'OFF',        # no fsync per commit during the load
+    'cache_size': -262144,       # 256 MB page cache
+    'temp_store': 'MEMORY'       # index builds sort in memory
+}
+LOADED_TABLES = ('ads', 'ads_categories', 'ads_sentiments')
+
+
 # In[37]:
 
 
-def ingest_ads(conn, rows):
+AD_COLUMNS = [
+    'ad_id','json_key','image_path','competitor','objects_symbols','image_width','image_height',
+    'image_format','ocr_text','ocr_word_count','ocr_confidence_avg','text_area_px','image_area_px',
+    'text_image_ratio','layout_type','dominant_color_1','dominant_color_2','dominant_color_3',
+    'dominant_color_4','dominant_color_5','color_palette_json','content_hash'
+]
+
+INSERT_AD = f'''
+INSERT OR IGNORE INTO ads ({','.join(AD_COLUMNS)})
+VALUES ({','.join('?' * len(AD_COLUMNS))})
+'''
+
+# changed ads drop their strategy label until the strategy model reassigns it
+UPSERT_AD = f'''
+INSERT INTO ads ({','.join(AD_COLUMNS)})
+VALUES ({','.join('?' * len(AD_COLUMNS))})
+ON CONFLICT(ad_id) DO UPDATE SET
+{','.join(f'{c} = excluded.{c}' for c in AD_COLUMNS[1:])},
+strategy = NULL, strategy_model = NULL
+'''
+
+INSERT_CATEGORY = '''
+INSERT OR IGNORE INTO ads_categories(
+ad_id,category_abbr,category_full,is_primary
+)
+VALUES(?,?,?,?)
+'''
+
+INSERT_SENTIMENT = '''
+INSERT OR IGNORE INTO ads_sentiments(
+ad_id,sentiment_abbr,sentiment_full
+)
+VALUES(?,?,?)
+'''
+
+def ad_values(row):
+    ''' Parameter tuple for INSERT_AD from one csv row, without content_hash'''
+    return (
+        row['ad_id'].strip(),
+        row['json_key'].strip(),
+        row['image_path'].strip(),
+        row['competitor'].strip(),
+        row['objects_symbols'].strip(),
+        int(row['image_width']),
+        int(row['image_height']),
+        row['image_format'].strip(),
+        row.get('ocr_text','').strip(),
+        int(row['ocr_word_count']),
+        float(row['ocr_confidence_avg']),
+        int(row['text_area_px']),
+        int(row['image_area_px']),
+        float(row['text_image_ratio']),
+        row['layout_type'].strip(),
+        row['dominant_color_1'].strip(),
+        row['dominant_color_2'].strip(),
+        row['dominant_color_3'].strip(),
+        row['dominant_color_4'].strip(),
+        row['dominant_color_5'].strip(),
+        row['color_palette_json'].strip()
+    )
+
+def category_values(ad_id, row):
+    categories_abbrs = row['all_categories'].split('|') if row['all_categories'] else []
+    categories_fulls = row['all_categories_full'].split('|') if row['all_categories_full'] else []
+    return [
+        (ad_id, cabbr, categories_fulls[i] if i<len(categories_fulls) else '', 1 if i==0 else 0)
+        for i, cabbr in enumerate(categories_abbrs)
+    ]
+
+def sentiment_values(ad_id, row):
+    sentiments_abbrs = row['all_sentiments'].split('|') if row['all_sentiments'] else []
+    sentiments_fulls = row['all_sentiments_full'].split('|') if row['all_sentiments_full'] else []
+    return [
+        (ad_id, sabbr, sentiments_fulls[i] if i<len(sentiments_fulls) else '')
+        for i, sabbr in enumerate(sentiments_abbrs)
+    ]
+
+
+# In[ ]:
+
+
+@contextmanager
+def bulk_load(conn, tables = LOADED_TABLES):
     '''
-    Insert ad rows from csv
+    Load-time settings: relaxed durability pragmas and secondary indexes on
+    tables dropped for the duration, rebuilt once at the end (one sort per
+    index instead of one b-tree update per row). Restores everything on exit
+    '''
+    saved = {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in LOAD_PRAGMAS}
+    for name, value in LOAD_PRAGMAS.items(): conn.execute(f'PRAGMA {name} = {value}')
+
+    marks = ','.join('?' * len(tables))
+    indexes = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marks})",
+        tables
+    ).fetchall()
+    for name, _ in indexes: conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+    try:
+        yield conn
+    finally:
+        for _, sql in indexes: conn.execute(sql)
+        conn.commit()
+        for name, value in saved.items(): conn.execute(f'PRAGMA {name} = {value}')
+
+def parse_ad(row):
+    '''
+    One csv row -> (ad tuple incl. content_hash, category tuples, sentiment tuples).
+    The hash covers everything stored for the ad, children included
+    '''
+    values = ad_values(row)
+    categories = category_values(values[0], row)
+    sentiments = sentiment_values(values[0], row)
+    content_hash = hashlib.sha1(repr((values, categories, sentiments)).encode('utf-8')).hexdigest()
+    return values + (content_hash,), categories, sentiments
+
+def ingest_ads(conn, rows, batch_size = BATCH_SIZE):
+    '''
+    Insert ad rows from csv, batched into one executemany per table,
+    all in a single transaction
     '''
     cur = conn.cursor()
     inserted = 0
-
-    for row in rows:
-        ad_id = row["ad_id"].strip()
-        cur.execute(
-            '''
-            INSERT OR IGNORE INTO ads (
-            ad_id,json_key,image_path,competitor,objects_symbols,image_width,image_height,
-            image_format,ocr_text,ocr_word_count,ocr_confidence_avg,text_area_px,image_area_px,
-            text_image_ratio,layout_type,dominant_color_1,dominant_color_2,dominant_color_3,
-            dominant_color_4,dominant_color_5,color_palette_json
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            ''',(
-                ad_id,
-                row['json_key'].strip(),
-                row['image_path'].strip(),
-                row['competitor'].strip(),
-                row['objects_symbols'].strip(),
-                int(row['image_width']),
-                int(row['image_height']),
-                row['image_format'].strip(),
-                row.get('ocr_text','').strip(),
-                int(row['ocr_word_count']),
-                float(row['ocr_confidence_avg']),
-                int(row['text_area_px']),
-                int(row['image_area_px']),
-                float(row['text_image_ratio']),
-                row['layout_type'].strip(),
-                row['dominant_color_1'].strip(),
-                row['dominant_color_2'].strip(),
-                row['dominant_color_3'].strip(),
-                row['dominant_color_4'].strip(),
-                row['dominant_color_5'].strip(),
-                row['color_palette_json'].strip()
-            )
-        )
-        inserted += cur.rowcount
-
-        # ad_categories
-
-        categories_abbrs = row['all_categories'].split('|') if row['all_categories'] else []
-        categories_fulls = row['all_categories_full'].split('|') if row['all_categories_full'] else []
-
-        for i, cabbr in enumerate(categories_abbrs):
-            full = categories_fulls[i] if i<len(categories_fulls) else ''
-            cur.execute(
-                '''
-                INSERT OR IGNORE INTO ads_categories(
-                ad_id,category_abbr,category_full,is_primary
-                )
-                VALUES(?,?,?,?)
-                ''',(ad_id,cabbr,full,1 if i==0 else 0)
-            )
-
-        # ad_sentiments
-
-        sentiments_abbrs = row['all_sentiments'].split('|') if row['all_sentiments'] else []
-        sentiments_fulls = row['all_sentiments_full'].split('|') if row['all_sentiments_full'] else [] 
-
-        for i, sabbr in enumerate(sentiments_abbrs):
-            full = sentiments_fulls[i] if i<len(sentiments_fulls) else ''
-            cur.execute(
-                '''
-                INSERT OR IGNORE INTO ads_sentiments(
-                ad_id,sentiment_abbr,sentiment_full
-                )
-                VALUES(?,?,?)
-                ''',(ad_id,sabbr,full)
-            )
+    ads, categories, sentiments = [], [], []
+
+    def flush():
+        nonlocal inserted
+        with instrumentation.timer('sqlite.insert'):
+            cur.executemany(INSERT_AD, ads)
+            inserted += cur.rowcount
+            cur.executemany(INSERT_CATEGORY, categories)
+            cur.executemany(INSERT_SENTIMENT, sentiments)
+        ads.clear(); categories.clear(); sentiments.clear()
+
+    with conn:
+        for row in rows:
+            values, cats, sents = parse_ad(row)
+            ads.append(values)
+            categories.extend(cats)
+            sentiments.extend(sents)
+            if len(ads) >= batch_size: flush()
+        flush()
     return inserted
 
 
+# In[ ]:
 
 
-# In[17]:
+def sync_ads(conn, rows, batch_size = BATCH_SIZE):
+    '''
+    Incremental sync: compares each row's content hash with the stored one and
+    upserts only new or changed ads. Children of changed ads are replaced, so
+    categories/sentiments that disappeared from the csv are deleted.
+    Returns {'inserted', 'updated', 'unchanged'}
+    '''
+    stored = dict(conn.execute('SELECT ad_id, content_hash FROM ads'))
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    ads, stale, categories, sentiments = [], [], [], []
+
+    def flush():
+        with instrumentation.timer('sqlite.insert'):
+            conn.executemany('DELETE FROM ads_categories WHERE ad_id = ?', stale)
+            conn.executemany('DELETE FROM ads_sentiments WHERE ad_id = ?', stale)
+            conn.executemany(UPSERT_AD, ads)
+            conn.executemany(INSERT_CATEGORY, categories)
+            conn.executemany(INSERT_SENTIMENT, sentiments)
+        ads.clear(); stale.clear(); categories.clear(); sentiments.clear()
+
+    with conn:
+        for row in rows:
+            values, cats, sents = parse_ad(row)
+            ad_id, content_hash = values[0], values[-1]
+            if ad_id not in stored: counts['inserted'] += 1
+            elif stored[ad_id] != content_hash:
+                counts['updated'] += 1
+                stale.append((ad_id,))
+            else:
+                counts['unchanged'] += 1
+                continue
+            stored[ad_id] = content_hash  # duplicate ad_ids in the csv: last one wins
+            ads.append(values)
+            categories.extend(cats)
+            sentiments.extend(sents)
+            if len(ads) >= batch_size: flush()
+        flush()
+    return counts
+
+
+def write_strategies(conn, labels, model_version, batch_size = BATCH_SIZE):
+    '''
+    Sets ads.strategy for existing ads.
+    labels: iterable of (ad_id, strategy); model_version is stored alongside.
+    Returns the number of ads updated
+    '''
+    update = 'UPDATE ads SET strategy = ?, strategy_model = ? WHERE ad_id = ?'
+    before = conn.total_changes
+    batch = []
+    with conn:
+        for ad_id, strategy in labels:
+            batch.append((strategy, str(model_version), str(ad_id)))
+            if len(batch) >= batch_size:
+                conn.executemany(update, batch)
+                batch.clear()
+        conn.executemany(update, batch)
+    return conn.total_changes - before
 
 
-def fill_database():
-    if not os.path.exists(DB_PATH): 
-        print(f'DB not found at {DB_PATH}')
-        return
+# In[17]:
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
-    conn.execute("PRAGMA journal_mode = WAL")
+
+def fill_database(mode = None):
+    '''
+    mode: 'bulk' (INSERT OR IGNORE load), 'sync' (incremental upsert)
+    or None: bulk into an empty database, sync otherwise
+    '''
+    conn = connect(DB_PATH)
 
     print('Reading ads csv...')
 
     rows = read_csv(ADS_CSV)
 
-    print('Inserting into database...')
-    n_ads = ingest_ads(conn,rows)
-    conn.commit()
+    if mode is None:
+        mode = 'sync' if conn.execute('SELECT 1 FROM ads LIMIT 1').fetchone() else 'bulk'
+
+    print(f'Inserting into database ({mode})...')
+    start = time.perf_counter()
+    if mode == 'bulk':
+        with bulk_load(conn):
+            n_ads = ingest_ads(conn,rows)
+        print(f'Number of insertions in core ads table is {n_ads}')
+    else:
+        counts = sync_ads(conn, rows)
+        print(f"Inserted {counts['inserted']} | updated {counts['updated']} | unchanged {counts['unchanged']}")
+    seconds = time.perf_counter() - start
 
-    print(f'Number of insertions in core ads table is {n_ads}')
+    print(f'Loaded {len(rows)} csv rows in {seconds:.3f}s ({len(rows) / max(seconds, 1e-9):,.0f} rows/s)')
 
     print('Testing...')
 
@@ -168,6 +462,11 @@ def fill_database():
     ):
         print(f'{row[0]} {row[1]}')
 
+    print('Testing query plans...')
+
+    for name, (ok, plan) in check_query_plans(conn).items():
+        print(f"{'ok  ' if ok else 'MISS'} {name}: {plan}")
+
     conn.close()
     print('Database saved')
 
@@ -179,29 +478,7 @@ def fill_database():
 
 
 if __name__=='__main__':
-    fill_database()
-
-
-# In[38]:
-
-
-import gc
-
-# Close any named connection
-try:
-    conn.close()
-    print("conn closed")
-except:
-    pass
-
-# Force close ALL open sqlite connections in this kernel
-for obj in gc.get_objects():
-    if type(obj).__name__ == "Connection":
-        try:
-            obj.close()
-            print(f"closed: {obj}")
-        except:
-            pass
+    instrumentation.run_stage('store', fill_database)
 
 
 # In[ ]:
@@ -1,21 +1,20 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-# In[12]:
-
-
-import subprocess
-subprocess.run(["jupyter", "nbconvert", "--to", "script", "extraction.ipynb"])
-
-
 # In[13]:
 
 
 import os
 from PIL import Image
 import csv
+import json
+import sqlite3
+import queue
+import time
 from multiprocessing import Pool
-from helpers import process_row, NEW_COLUMNS
+from helpers import process_chunk, NEW_COLUMNS, get_feature_cache
+import columnar
+import instrumentation
 
 
 # In[14]:
@@ -23,61 +22,297 @@ from helpers import process_row, NEW_COLUMNS
 
 INPUT_CSV = 'collected_ads.csv'
 OUTPUT_CSV = 'collected_ads_enriched.csv'
-NUM_WORKERS = 4
+NUM_WORKERS = None        # None: one worker per available core
+TESSERACT_THREADS = None  # OMP_THREAD_LIMIT per tesseract call; None: cores // workers
 
+# CHECKPOINTING
+CHECKPOINT_DB = 'extraction_checkpoint.sqlite'
+FLUSH_EVERY = 100      # commit finished rows to the checkpoint every N rows
+RETRY_FAILED = False   # re-run ads whose last status was failed/skipped
 
-# In[15]:
+# STREAMING / SCHEDULING
+TASKS_PER_WORKER = 2         # pool tasks queued per worker (bounds rows held in memory)
+CHUNK_TARGET_SECONDS = 1.0   # aim for pool tasks of about this long
+MAX_CHUNK_SIZE = 64          # rows per pool task at most
 
 
-def extract_all():
-    with open(INPUT_CSV, 'r', encoding = 'utf-8') as f:
-        reader = csv.DictReader(f)
-        all_rows = list(reader)
-        original_fields = reader.fieldnames
+# In[ ]:
 
-    total = len(all_rows)
-    print(f'Total Images to process {total}')
 
-    # Process all rows in parallel
+# CHECKPOINT STORE
+def open_checkpoint(path = CHECKPOINT_DB):
+    '''
+    One row per finished ad_id, written as soon as the worker returns it,
+    so a crashed run keeps everything up to the last flush
+    '''
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS extracted (
+    ad_id TEXT PRIMARY KEY,
+    extraction_status TEXT NOT NULL,
+    row_json TEXT NOT NULL
+    )
+    ''')
+    conn.commit()
+    return conn
+
+def checkpoint_row(conn, row):
+    conn.execute(
+        'INSERT OR REPLACE INTO extracted (ad_id, extraction_status, row_json) VALUES (?,?,?)',
+        (row['ad_id'], row['extraction_status'], json.dumps(row))
+    )
+
+def load_checkpointed_row(conn, ad_id):
+    found = conn.execute('SELECT row_json FROM extracted WHERE ad_id = ?', (ad_id,)).fetchone()
+    return json.loads(found[0]) if found else None
+
+def is_finished(enriched, retry_failed = RETRY_FAILED):
+    '''
+    Whether a checkpointed row can be reused as is:
+    any checkpointed ad, or only successful ones when retry_failed
+    '''
+    if enriched is None: return False
+    return enriched['extraction_status'] == 'success' or not retry_failed
+
+# optional columns from data_collect (RECORD_IMAGE_STAT)
+IMAGE_STAT_COLUMNS = ('image_size', 'image_mtime')
+
+def image_changed(row, enriched):
+    '''
+    Whether the image was replaced since it was checkpointed, judged by the
+    size/mtime data_collect recorded; rows without them are never "changed"
+    '''
+    return any(
+        row.get(col) and str(row[col]) != str(enriched.get(col, ''))
+        for col in IMAGE_STAT_COLUMNS
+    )
 
-    with Pool(processes = NUM_WORKERS) as pool :
-        enriched_rows = []
-        for idx, row in enumerate(pool.imap(process_row, all_rows), 1):
-            enriched_rows.append(row)
 
-            if idx%500==0:
-                done_s = sum(1 for r in enriched_rows if r["extraction_status"] == "success")
-                done_f = sum(1 for r in enriched_rows if r["extraction_status"].startswith("failed"))
-                done_k = idx - done_s - done_f
-                print(f"  [{idx:>5}/{total}] {done_s} |  {done_f} |  {done_k}")
+# In[ ]:
 
 
+# WORKER PLANNING
+def available_cores():
+    ''' Cores this process may run on (respects taskset / container cpusets)'''
+    try: return len(os.sched_getaffinity(0))
+    except AttributeError: return os.cpu_count() or 1
+
+def plan_workers(num_workers = None, tesseract_threads = None):
+    '''
+    Returns (pool size, OMP_THREAD_LIMIT for tesseract).
+    By default the pool takes every core and each tesseract call one thread,
+    so pool workers and tesseract's OpenMP threads do not oversubscribe
+    '''
+    cores = available_cores()
+    workers = num_workers or cores
+    threads = tesseract_threads or max(1, cores // workers)
+    return workers, threads
+
+def init_worker(tesseract_threads):
+    # inherited by the tesseract subprocess pytesseract starts
+    os.environ['OMP_THREAD_LIMIT'] = str(tesseract_threads)
+
+class ChunkSizer:
+    '''
+    Picks rows per pool task from the measured per-image latency so each task
+    takes about target_seconds: enough rows to amortize the pickle round-trip,
+    few enough that the work stays balanced across workers
+    '''
+    def __init__(self, target_seconds = CHUNK_TARGET_SECONDS, max_size = MAX_CHUNK_SIZE, smoothing = 0.3):
+        self.target_seconds = target_seconds
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.latency = None  # moving average, seconds per row
+
+    def record(self, n_rows, seconds):
+        if not n_rows: return
+        per_row = seconds / n_rows
+        if self.latency is None: self.latency = per_row
+        else: self.latency += self.smoothing * (per_row - self.latency)
+
+    @property
+    def size(self):
+        # start with single rows until there is a measurement
+        if self.latency is None: return 1
+        return max(1, min(self.max_size, int(self.target_seconds / max(self.latency, 1e-6))))
 
 
-    final_fields = original_fields + [c for c in NEW_COLUMNS if c not in original_fields]
-    with open(OUTPUT_CSV, 'w', newline='',encoding = 'utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames = final_fields)
-        writer.writeheader()
-        writer.writerows(enriched_rows)
+# In[ ]:
+
+
+# STREAMING
+def count_rows(path):
+    ''' Data rows in a csv, counted without keeping any of them'''
+    with open(path, 'r', encoding = 'utf-8', newline = '') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+def stream_process(pool, items, sizer, max_tasks, on_complete = None):
+    '''
+    items: iterable of (row, done) where done is the finished row or None.
+
+    Rows that still need work go to the pool in chunks sized by sizer, with at
+    most max_tasks chunks outstanding. Chunks are collected in completion
+    order (like imap_unordered), on_complete(rows) sees them right away, and a
+    reorder buffer restores input order.
+    Yields (row, was_processed) in input order
+    '''
+    completed = queue.Queue()
+    ready = {}   # seq -> [(row, was_processed)] finished, waiting for earlier seqs
+    next_seq = next_out = 0
+    chunk = []
+
+    def submit(rows):
+        nonlocal next_seq
+        seq, next_seq = next_seq, next_seq + 1
+        pool.apply_async(
+            process_chunk, (rows,),
+            callback = lambda res: completed.put((seq, res)),
+            error_callback = lambda exc: completed.put((seq, exc))
+        )
+
+    def collect():
+        seq, res = completed.get()
+        if isinstance(res, BaseException): raise res
+        rows, seconds = res
+        sizer.record(len(rows), seconds)
+        if on_complete: on_complete(rows)
+        ready[seq] = [(r, True) for r in rows]
+
+    def drain():
+        nonlocal next_out
+        while next_out in ready:
+            yield from ready.pop(next_out)
+            next_out += 1
+
+    for row, done in items:
+        if done is None:
+            chunk.append(row)
+            if len(chunk) >= sizer.size:
+                submit(chunk)
+                chunk = []
+        else:
+            # keep input order: rows gathered so far go out before the finished one
+            if chunk:
+                submit(chunk)
+                chunk = []
+            ready[next_seq] = [(done, False)]
+            next_seq += 1
+
+        yield from drain()
+        # after a drain the oldest outstanding seq is always a submitted chunk
+        while next_seq - next_out > max_tasks:
+            collect()
+            yield from drain()
+
+    if chunk: submit(chunk)
+    yield from drain()
+    while next_out < next_seq:
+        collect()
+        yield from drain()
+
+
+# In[15]:
+
+
+def extract_all(resume = True, retry_failed = RETRY_FAILED, flush_every = FLUSH_EVERY, num_workers = NUM_WORKERS):
+    '''
+    resume: skip ads already in the checkpoint (False starts from scratch)
+    retry_failed: on resume, process failed/skipped ads again
+    flush_every: checkpoint commit interval in rows
+    num_workers: pool size, None for one per available core
+
+    Streams end to end: input rows are read lazily, a bounded number of chunks
+    is with the workers, and each row is written out as soon as it is ready,
+    so memory does not grow with the number of ads.
+    Returns the run summary as a dict
+    '''
+    with instrumentation.timer('csv.count_rows'): total = count_rows(INPUT_CSV)
+    workers, tesseract_threads = plan_workers(num_workers, TESSERACT_THREADS)
+    print(f'Total Images to process {total}')
+    print(f'Workers {workers} | tesseract threads per worker {tesseract_threads}')
+
+    conn = open_checkpoint(CHECKPOINT_DB)
+    if not resume:
+        conn.execute('DELETE FROM extracted')
+        conn.commit()
+
+    def with_checkpoint(rows):
+        for row in rows:
+            enriched = load_checkpointed_row(conn, row['ad_id'])
+            if not is_finished(enriched, retry_failed) or image_changed(row, enriched): enriched = None
+            yield row, enriched
+
+    processed = 0
+    def on_complete(rows):
+        # checkpoint in completion order, before the rows wait in the reorder buffer
+        nonlocal processed
+        for row in rows:
+            with instrumentation.timer('sqlite.insert'): checkpoint_row(conn, row)
+            processed += 1
+            if processed%flush_every==0: conn.commit()
+
+    success = failed = reused = 0
+    sizer = ChunkSizer()
+    tmp_path = OUTPUT_CSV + '.tmp'
+    start = time.perf_counter()
+    try:
+        with open(INPUT_CSV, 'r', encoding = 'utf-8') as fin, \
+             open(tmp_path, 'w', newline='', encoding = 'utf-8') as fout, \
+             Pool(processes = workers, initializer = init_worker, initargs = (tesseract_threads,)) as pool:
+            reader = csv.DictReader(fin)
+            original_fields = reader.fieldnames
+            final_fields = original_fields + [c for c in NEW_COLUMNS if c not in original_fields]
+            writer = csv.DictWriter(fout, fieldnames = final_fields, extrasaction = 'ignore')
+            writer.writeheader()
+
+            # Process remaining rows in parallel, checkpointing and writing as they finish
+
+            rows = stream_process(pool, with_checkpoint(reader), sizer, workers * TASKS_PER_WORKER, on_complete)
+            for idx, (row, was_processed) in enumerate(rows, 1):
+                with instrumentation.timer('csv.write'): writer.writerow(row)
+                if row["extraction_status"] == "success": success += 1
+                elif row["extraction_status"].startswith("failed"): failed += 1
+                if not was_processed: reused += 1
+
+                if idx%500==0:
+                    print(f"  [{idx:>5}/{total}] {success} |  {failed} |  {idx - success - failed} | chunk {sizer.size}")
+    finally:
+        conn.commit()
+        conn.close()
+    os.replace(tmp_path, OUTPUT_CSV)
+    # Parquet copy for the later stages (skipped without pyarrow)
+    if columnar.write_copy(OUTPUT_CSV): print(f'Parquet copy saved {columnar.parquet_path(OUTPUT_CSV)}')
+    seconds = time.perf_counter() - start
 
-    success = sum(1 for r in enriched_rows if r["extraction_status"] == "success")
-    failed  = sum(1 for r in enriched_rows if r["extraction_status"].startswith("failed"))
     skipped = total - success - failed
 
     print('Final Summary')
     print(f'Total {total}')
+    print(f'Reused from checkpoint {reused}')
     print(f'Success {success}')
     print(f'Failed {failed}')
     print(f'Skipped {skipped}')
+    print(f'Processed {processed} in {seconds:.1f}s ({processed / seconds:.2f} img/s)')
+
+    cache = get_feature_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Feature cache {stats['hits']} hits | {stats['misses']} misses | {stats['evictions']} evicted | {stats['entries']} entries ({stats['hit_rate']:.1%} hit rate)")
     print('Enriched CSV saved')
 
+    return {
+        'total': total, 'success': success, 'failed': failed, 'skipped': skipped,
+        'reused': reused, 'processed': processed, 'seconds': seconds,
+        'workers': workers, 'tesseract_threads': tesseract_threads
+    }
+
 
 
 # In[16]:
 
 
 if __name__ == '__main__':
-    extract_all()
+    instrumentation.run_stage('extract', extract_all)
 
 
 # In[ ]:
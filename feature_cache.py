@@ -0,0 +1,151 @@
+'''
+Persistent cache of per-image extraction results.
+
+Entries are keyed by the SHA-256 of the image bytes plus a fingerprint of
+everything that changes the raw result (extractor version, tesseract version
+and config, palette engine settings). Only raw results are stored: the
+word-level pytesseract data and the palette, so layout thresholds and rules
+can be re-applied without running tesseract again.
+
+The store is a single SQLite file shared by all worker processes. It is
+bounded by total payload size (least recently used entries are evicted), and
+hit/miss counters are kept in the same file so they add up across workers.
+Lookups only read: each process keeps its hit/miss counts and access times in
+memory and writes them in one transaction on put(), every FLUSH_EVERY
+lookups and on flush(), so cache hits in parallel workers do not queue on
+the write lock.
+'''
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+FLUSH_EVERY = 256  # lookups between writes of the pending counters and access times
+
+
+def image_hash(raw):
+    ''' Content hash of the encoded image bytes'''
+    return hashlib.sha256(raw).hexdigest()
+
+
+def make_fingerprint(**settings):
+    ''' Stable short hash of the settings that affect the cached results'''
+    blob = json.dumps(settings, sort_keys = True, default = str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+
+class FeatureCache:
+    def __init__(self, path, max_bytes = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, timeout = 60)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS features (
+        image_hash TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        last_access REAL NOT NULL,
+        PRIMARY KEY (image_hash, fingerprint)
+        );
+        CREATE INDEX IF NOT EXISTS idx_features_last_access ON features(last_access);
+        CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO stats(name, value) VALUES
+        ('hits', 0), ('misses', 0), ('evictions', 0), ('bytes', 0);
+        ''')
+        self.conn.commit()
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._counts = {'hits': 0, 'misses': 0}
+        self._accessed = {}  # (image_hash, fingerprint) -> last access time, not written yet
+        self._lookups = 0
+
+    def _bump(self, name, by = 1):
+        self.conn.execute('UPDATE stats SET value = value + ? WHERE name = ?', (by, name))
+
+    def get(self, key, fingerprint):
+        ''' Returns the cached payload dict, or None on a miss'''
+        found = self.conn.execute(
+            'SELECT payload FROM features WHERE image_hash = ? AND fingerprint = ?',
+            (key, fingerprint)
+        ).fetchone()
+        if found is None:
+            self._counts['misses'] += 1
+        else:
+            self._counts['hits'] += 1
+            self._accessed[(key, fingerprint)] = time.time()
+        self._lookups += 1
+        if self._lookups >= FLUSH_EVERY: self.flush()
+        return None if found is None else json.loads(found[0])
+
+    def _write_pending(self):
+        ''' Writes this process' pending counters and access times (in the caller's transaction)'''
+        for name, n in self._counts.items():
+            if n: self._bump(name, n)
+        self.conn.executemany(
+            'UPDATE features SET last_access = ? WHERE image_hash = ? AND fingerprint = ?',
+            [(t, key, fp) for (key, fp), t in self._accessed.items()]
+        )
+        self._reset_pending()
+
+    def flush(self):
+        if not self._lookups: return
+        with self.conn: self._write_pending()
+
+    def put(self, key, fingerprint, payload):
+        blob = json.dumps(payload)
+        size = len(blob)
+        with self.conn:
+            self._write_pending()  # before _evict, which goes by last_access
+            old = self.conn.execute(
+                'SELECT size_bytes FROM features WHERE image_hash = ? AND fingerprint = ?',
+                (key, fingerprint)
+            ).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO features VALUES (?,?,?,?,?)',
+                (key, fingerprint, blob, size, time.time())
+            )
+            self._bump('bytes', size - (old[0] if old else 0))
+            self._evict()
+
+    def _evict(self):
+        ''' Drops least recently used entries until the payload total fits max_bytes'''
+        total = self.conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if not self.max_bytes or total <= self.max_bytes: return
+
+        freed, dropped = 0, []
+        for key, fp, size in self.conn.execute(
+            'SELECT image_hash, fingerprint, size_bytes FROM features ORDER BY last_access'
+        ):
+            if total - freed <= self.max_bytes: break
+            dropped.append((key, fp))
+            freed += size
+        self.conn.executemany('DELETE FROM features WHERE image_hash = ? AND fingerprint = ?', dropped)
+        self._bump('bytes', -freed)
+        self._bump('evictions', len(dropped))
+
+    def stats(self):
+        self.flush()
+        out = dict(self.conn.execute('SELECT name, value FROM stats'))
+        out['entries'] = self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+        lookups = out['hits'] + out['misses']
+        out['hit_rate'] = round(out['hits'] / lookups, 4) if lookups else 0.0
+        return out
+
+    def clear(self):
+        self._reset_pending()
+        with self.conn:
+            self.conn.execute('DELETE FROM features')
+            self.conn.execute('UPDATE stats SET value = 0')
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -1,27 +1,28 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-# In[34]:
-
-
-import subprocess
-subprocess.run(["jupyter", "nbconvert", "--to", "script", "helpers.ipynb"])
-
-
 # In[33]:
 
 
+import functools
+import io
 import json
 import os
+import time
 from PIL import Image
 import pytesseract
 import colorthief as ct
+import numpy as np
+import cv2
+import palette as np_palette
+import feature_cache as fc
+import instrumentation
 
 
 # In[35]:
 
 
-get_ipython().system('pip install pytesseract pillow colorthief opencv-python')
+# dependencies: pip install pytesseract pillow colorthief opencv-python
 
 
 # In[27]:
@@ -32,6 +33,26 @@ TEXT_HEAVY_THRESHOLD = 0.40 # > 40% of image area is text--text_heavy
 IMAGE_HEAVY_THRESHOLD = 0.20 # < 20%  of image area is text--image_heavy
 # Between 20–40% -- balanced
 
+# PALETTE ENGINE
+PALETTE_ENGINE = 'numpy'      # 'numpy' (palette.py) or 'colorthief'
+PALETTE_PIXEL_BUDGET = np_palette.DEFAULT_PIXEL_BUDGET  # pixels sampled per image by the numpy engine
+
+# OCR
+TESSERACT_CONFIG = ''  # extra pytesseract config string
+OCR_MODE = 'full'      # 'full': whole image; 'roi': detected text regions only, rescaled
+
+# ROI OCR (OCR_MODE = 'roi')
+ROI_DETECT_MAX_SIDE = 1024     # text-region detection runs on a copy no larger than this
+ROI_TARGET_TEXT_HEIGHT = 32    # px; each region is rescaled so its text lines land near this height
+ROI_SCALE_RANGE = (0.25, 1.0)  # never upscale, never shrink below a quarter
+ROI_PADDING = 6                # px around each region (original resolution)
+ROI_MAX_COVERAGE = 0.6         # regions covering more of the image -> OCR the whole (downscaled) image
+
+# FEATURE CACHE
+FEATURE_CACHE_PATH = 'feature_cache.sqlite'  # None disables the cache
+FEATURE_CACHE_MAX_BYTES = fc.DEFAULT_MAX_BYTES
+EXTRACTOR_VERSION = 2  # bump when run_ocr / palette output changes, invalidates cached entries
+
 
 # In[28]:
 
@@ -41,13 +62,26 @@ def rgb_to_hex(rgb_tuple):
     ''' Convert (R,G,B) to #RRGGBB'''
     return '#{:02X}{:02X}{:02X}'.format(*rgb_tuple)
 
-def get_dominant_colors(image_path, n_colors = 5):
+class DecodedColorThief(ct.ColorThief):
+    ''' ColorThief over an already decoded PIL image (no second file open)'''
+    def __init__(self, image):
+        self.image = image
+
+def get_dominant_colors(image, n_colors = 5, engine = None):
     '''
+    image: path or decoded PIL image (see load_image)
     Returns list of hex color strings, most dominant first
-    Uses colorthief which runs k-means on the image pixels 
+    engine 'numpy' runs the vectorized median-cut in palette.py on a downsampled
+    pixel array; 'colorthief' runs colorthief's median-cut over every pixel
     '''
+    engine = engine or PALETTE_ENGINE
     try:
-        thief = ct.ColorThief(image_path)
+        if engine == 'numpy':
+            palette = np_palette.get_palette(image, n_colors = max(n_colors, 5), pixel_budget = PALETTE_PIXEL_BUDGET)
+            return [rgb_to_hex(c) for c in palette[:n_colors]]
+
+        if isinstance(image, Image.Image): thief = DecodedColorThief(image)
+        else: thief = ct.ColorThief(image)
         if n_colors ==1: palette = [thief.get_color(quality = 1)]
         else: palette = thief.get_palette(color_count = n_colors, quality = 1)
         return [rgb_to_hex(c) for c in palette]
@@ -56,23 +90,69 @@ def get_dominant_colors(image_path, n_colors = 5):
 
 
 
+# In[ ]:
+
+
+# SINGLE DECODE
+def read_image_bytes(image_path):
+    with open(image_path, 'rb') as f: return f.read()
+
+def decode_image(raw):
+    '''
+    Decodes encoded image bytes once.
+    Returns the decoded PIL image (original mode and format kept),
+    shared by the OCR/layout and palette stages
+    '''
+    with instrumentation.timer('Image.open'):
+        # verify() leaves the image unusable, so it runs on its own parser over the same bytes
+        Image.open(io.BytesIO(raw)).verify()
+
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+    return img
+
+def load_image(image_path):
+    ''' Reads the file once and decodes it once'''
+    return decode_image(read_image_bytes(image_path))
+
+def to_rgb(img):
+    ''' RGB view of a decoded image, no copy if it already is RGB'''
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
 # In[29]:
 
 
 # OCR + LAYOUT ANALYSIS
-def extract_ocr_and_layout(image_path):
+def extract_ocr_and_layout(image):
     '''
+    image: path or decoded PIL image (see load_image)
     Returns dict with:
       ocr_text, ocr_word_count, ocr_confidence_avg,
       text_area_px, image_area_px, text_image_ratio, layout_type
     '''
 
-    img = Image.open(image_path).convert('RGB')
+    if not isinstance(image, Image.Image): image = Image.open(image)
+    img = to_rgb(image)
     img_w, img_h = img.size
-    image_area_px = img_w * img_h
+    return summarize_ocr(run_ocr(img), img_w, img_h, image.format)
+
+# word-level fields kept from pytesseract output
+OCR_DATA_KEYS = ('text', 'conf', 'left', 'top', 'width', 'height')
 
-    # pytesseract word-level data
-    data = pytesseract.image_to_data(img, output_type = pytesseract.Output.DICT)
+def run_ocr(img, mode = None):
+    ''' Raw pytesseract word-level data of an RGB image (JSON serializable)'''
+    if (mode or OCR_MODE) == 'roi': return run_roi_ocr(img)
+    with instrumentation.timer('pytesseract.image_to_data'):
+        data = pytesseract.image_to_data(img, config = TESSERACT_CONFIG, output_type = pytesseract.Output.DICT)
+    return {k: list(data[k]) for k in OCR_DATA_KEYS}
+
+def summarize_ocr(data, img_w, img_h, image_format):
+    '''
+    Applies the confidence filter and layout thresholds to raw word-level data.
+    Cheap: re-running it after a threshold change needs no tesseract call
+    '''
+    image_area_px = img_w * img_h
 
     words = []
     confidences = []
@@ -103,7 +183,7 @@ def extract_ocr_and_layout(image_path):
     return {
         'image_width'       :img_w,
         'image_height'      :img_h,
-        'image_format'      :img.format if img.format else 'UNKNOWN',
+        'image_format'      :image_format if image_format else 'UNKNOWN',
         'ocr_text'          :ocr_text,
         'ocr_word_count'    :ocr_word_count,
         'ocr_confidence_avg':ocr_conf_avg,
@@ -115,19 +195,210 @@ def extract_ocr_and_layout(image_path):
 
 
 
+# In[ ]:
+
+
+# ROI OCR
+def detect_text_regions(img):
+    '''
+    Cheap text detector: morphological gradient -> Otsu -> horizontal closing
+    gives one blob per text line; nearby lines are merged into blocks.
+    Returns [(x, y, w, h, line_height)] in original pixels, reading order
+    '''
+    gray = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2GRAY)
+    img_h, img_w = gray.shape
+    f = min(1.0, ROI_DETECT_MAX_SIDE / max(img_w, img_h))
+    if f < 1.0: gray = cv2.resize(gray, None, fx = f, fy = f, interpolation = cv2.INTER_AREA)
+
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+
+    # text lines: wide-ish, not too tall, mostly filled with edges
+    n, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity = 8)
+    line_boxes = []
+    for x, y, w, h, area in stats[1:]:
+        if h < 6 or w < 8 or h > 0.25 * gray.shape[0]: continue
+        if w / h < 1.2 or area / (w * h) < 0.35: continue
+        line_boxes.append((x, y, w, h))
+    if not line_boxes: return []
+
+    # blocks: dilate the kept lines so neighbouring lines/words join
+    mask = np.zeros_like(lines)
+    for x, y, w, h in line_boxes: mask[y:y + h, x:x + w] = 255
+    mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 7)))
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity = 8)
+
+    heights = {}
+    for x, y, w, h in line_boxes: heights.setdefault(labels[y + h // 2, x + w // 2], []).append(h)
+
+    regions = []
+    for label in range(1, n):
+        if label not in heights: continue
+        x, y, w, h, _ = stats[label]
+        regions.append((
+            int(x / f), int(y / f), int(np.ceil(w / f)), int(np.ceil(h / f)),
+            float(np.median(heights[label])) / f
+        ))
+    regions.sort(key = lambda r: (r[1], r[0]))
+    return regions
+
+def ocr_region(img, box, scale):
+    '''
+    OCRs img cropped to box=(x, y, w, h) and resized by scale.
+    Word boxes are mapped back to original image coordinates
+    '''
+    x, y, w, h = box
+    crop = img.crop((x, y, x + w, y + h))
+    if scale != 1.0:
+        crop = crop.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+    with instrumentation.timer('pytesseract.image_to_data'):
+        data = pytesseract.image_to_data(crop, config = TESSERACT_CONFIG, output_type = pytesseract.Output.DICT)
+    return {
+        'text'  : list(data['text']),
+        'conf'  : list(data['conf']),
+        'left'  : [x + round(v / scale) for v in data['left']],
+        'top'   : [y + round(v / scale) for v in data['top']],
+        'width' : [round(v / scale) for v in data['width']],
+        'height': [round(v / scale) for v in data['height']]
+    }
+
+def merge_overlapping(boxes):
+    '''
+    Merges overlapping (x0, y0, x1, y1, line_height) boxes until none overlap,
+    so no word is OCRed twice. A merged box keeps its smallest line height
+    (the scale that keeps all of its text readable). Returns them in reading order
+    '''
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for box in boxes:
+            for i, other in enumerate(out):
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    out[i] = (
+                        min(box[0], other[0]), min(box[1], other[1]),
+                        max(box[2], other[2]), max(box[3], other[3]), min(box[4], other[4])
+                    )
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return sorted(boxes, key = lambda b: (b[1], b[0]))
+
+def text_scale(line_height):
+    ''' Resize factor that brings text of line_height px to ROI_TARGET_TEXT_HEIGHT'''
+    lo, hi = ROI_SCALE_RANGE
+    return min(hi, max(lo, ROI_TARGET_TEXT_HEIGHT / max(line_height, 1.0)))
+
+def run_roi_ocr(img):
+    '''
+    Fast OCR: detect candidate text regions, OCR only those, each at the
+    resolution that keeps its text readable. Falls back to the whole
+    (downscaled) image when the regions cover most of it.
+    Same output as run_ocr, boxes in original pixels
+    '''
+    img_w, img_h = img.size
+    regions = detect_text_regions(img)
+    data = {k: [] for k in OCR_DATA_KEYS}
+    if not regions: return data
+
+    covered = sum(w * h for _, _, w, h, _ in regions)
+    if covered > ROI_MAX_COVERAGE * img_w * img_h:
+        line_height = float(np.median([r[4] for r in regions]))
+        return ocr_region(img, (0, 0, img_w, img_h), text_scale(line_height))
+
+    # padding can make neighbouring regions overlap
+    padded = [
+        (max(0, x - ROI_PADDING), max(0, y - ROI_PADDING),
+         min(img_w, x + w + ROI_PADDING), min(img_h, y + h + ROI_PADDING), line_height)
+        for x, y, w, h, line_height in regions
+    ]
+    for x0, y0, x1, y1, line_height in merge_overlapping(padded):
+        region = ocr_region(img, (x0, y0, x1 - x0, y1 - y0), text_scale(line_height))
+        for k in OCR_DATA_KEYS: data[k].extend(region[k])
+    return data
+
+
+
+# In[ ]:
+
+
+# FEATURE CACHE
+_feature_cache = None  # (pid, path, FeatureCache); sqlite connections must not cross a fork
+
+def get_feature_cache():
+    ''' This process' cache at FEATURE_CACHE_PATH (reopened when the path changes), None when disabled'''
+    global _feature_cache
+    if not FEATURE_CACHE_PATH: return None
+    if _feature_cache is None or _feature_cache[:2] != (os.getpid(), FEATURE_CACHE_PATH):
+        if _feature_cache is not None and _feature_cache[0] == os.getpid(): _feature_cache[2].close()
+        _feature_cache = (os.getpid(), FEATURE_CACHE_PATH, fc.FeatureCache(FEATURE_CACHE_PATH, FEATURE_CACHE_MAX_BYTES))
+    return _feature_cache[2]
+
+@functools.lru_cache(maxsize = None)
+def tesseract_version():
+    return str(pytesseract.get_tesseract_version())
+
+def extractor_fingerprint():
+    ''' Everything that changes run_ocr / palette output for the same image bytes'''
+    return fc.make_fingerprint(
+        version = EXTRACTOR_VERSION,
+        tesseract = tesseract_version(),
+        tesseract_config = TESSERACT_CONFIG,
+        ocr_mode = OCR_MODE,
+        roi = (ROI_DETECT_MAX_SIDE, ROI_TARGET_TEXT_HEIGHT, ROI_SCALE_RANGE, ROI_PADDING, ROI_MAX_COVERAGE) if OCR_MODE == 'roi' else None,
+        palette_engine = PALETTE_ENGINE,
+        palette_pixel_budget = PALETTE_PIXEL_BUDGET
+    )
+
+
 # In[30]:
 
 
 # PER IMAGE PROCESSING
+def raw_image_features(img):
+    '''
+    The expensive, cacheable part of one image:
+    size/format, raw OCR word data and the palette
+    '''
+    rgb = to_rgb(img)
+    img_w, img_h = rgb.size
+    ocr_data = run_ocr(rgb)
+    with instrumentation.timer('get_dominant_colors'):
+        colors = get_dominant_colors(img, n_colors = 5)
+    return {
+        'image_width'  :img_w,
+        'image_height' :img_h,
+        'image_format' :img.format,
+        'ocr_data'     :ocr_data,
+        'colors'       :colors
+    }
+
 def process_image(image_path):
     '''
     Runs OCR + color extraction on one image.
+    Raw results come from the feature cache when the image bytes were seen before.
     Returns a merged feature dict
     '''
-    Image.open(image_path).verify()
-
-    layout_data = extract_ocr_and_layout(image_path)
-    colors = get_dominant_colors(image_path, n_colors = 5)
+    raw = read_image_bytes(image_path)
+
+    cache = get_feature_cache()
+    if cache is None:
+        features = raw_image_features(decode_image(raw))
+    else:
+        key, fingerprint = fc.image_hash(raw), extractor_fingerprint()
+        features = cache.get(key, fingerprint)
+        if features is None:
+            features = raw_image_features(decode_image(raw))
+            cache.put(key, fingerprint, features)
+
+    layout_data = summarize_ocr(
+        features['ocr_data'], features['image_width'], features['image_height'], features['image_format']
+    )
+    colors = list(features['colors'])
 
     # Pad colors list to have 5 slots
     while len(colors) < 5: colors.append(None)
@@ -173,10 +444,10 @@ def process_row(row):
 
         return row
 
-    # # skip if already processed
-    # if row.get('extraction_status') == 'success':
+    # skip if already processed
+    if row.get('extraction_status') == 'success':
 
-    #     return row
+        return row
 
     try:
         features = process_image(image_path)
@@ -199,6 +470,23 @@ def process_row(row):
 # In[ ]:
 
 
+def process_chunk(rows):
+    '''
+    One pool task: several rows per pickle round-trip.
+    Returns (enriched rows, seconds spent) so the caller can size later chunks
+    '''
+    start = time.perf_counter()
+    enriched = [process_row(row) for row in rows]
+    # workers are not told when the pool ends
+    cache = get_feature_cache()
+    if cache is not None: cache.flush()
+    instrumentation.flush()
+    return enriched, time.perf_counter() - start
+
+
+# In[ ]:
+
+
 
 
 
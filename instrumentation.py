@@ -0,0 +1,215 @@
+'''
+Per-stage timers and optional profiles for pipeline runs.
+
+    instrumentation.run_stage('extract', extract_all)   # times and reports one stage
+    with instrumentation.timer('pytesseract.image_to_data'): ...
+    instrumentation.flush()                             # in pool workers, after each task
+
+A run is a directory (under REPORT_ROOT) exported through an environment
+variable, so pool workers (forked) and pipeline.py's stage processes record
+into the same run. Each process keeps, per timer, the count, total and max
+and a histogram of log-spaced latency buckets (BUCKET_GROWTH apart), so its
+memory stays the same however many calls it times. flush() appends them to
+the process' file in the run directory; report() merges the files of every
+process into report.json: count, total and latency percentiles (within
+BUCKET_GROWTH) per stage and timer. Nothing is recorded outside a run, and
+timer() is then a shared no-op context.
+
+Profiles are opt-in (start(profile = True) or PIPELINE_PROFILE=1): each
+stage's main process is run under cProfile and dumped to <stage>.prof in the
+run directory, for pstats / snakeviz. py-spy needs no hook: attach it to a
+stage or worker process with py-spy record --pid <pid>.
+'''
+
+import cProfile
+import glob
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+
+RUN_DIR_ENV = 'PIPELINE_INSTRUMENT_DIR'  # the active run's directory
+STAGE_ENV = 'PIPELINE_STAGE'             # stage the samples of this process belong to
+PROFILE_ENV = 'PIPELINE_PROFILE'         # '1': cProfile each stage
+REPORT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instrumentation')
+PERCENTILES = (50, 90, 99)
+BUCKET_FLOOR_S = 1e-6  # latencies up to this share the first histogram bucket
+BUCKET_GROWTH = 1.01   # each bucket's upper bound is 1% above the previous one
+
+_NO_TIMER = nullcontext()
+_run_dir = os.environ.get(RUN_DIR_ENV)  # set here for processes started inside a run
+_samples = (None, None)  # (pid, {timer: _Stats}); a forked worker must not re-send its parent's samples
+
+
+def enabled():
+    return _run_dir is not None
+
+
+def _local():
+    global _samples
+    if _samples[0] != os.getpid(): _samples = (os.getpid(), defaultdict(_Stats))
+    return _samples[1]
+
+
+class _Stats:
+    ''' count, total, max and latency histogram of one timer; fixed size however many samples'''
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count, self.total, self.max = 0, 0.0, 0.0
+        self.buckets = defaultdict(int)  # bucket index -> samples
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+        bucket = math.ceil(math.log(seconds / BUCKET_FLOOR_S, BUCKET_GROWTH)) if seconds > BUCKET_FLOOR_S else 0
+        self.buckets[bucket] += 1
+
+    def merge(self, other):
+        ''' Adds another process' stats, as written by to_dict()'''
+        self.count += other['count']
+        self.total += other['total']
+        self.max = max(self.max, other['max'])
+        for bucket, n in other['buckets'].items(): self.buckets[int(bucket)] += n
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'max': self.max, 'buckets': self.buckets}
+
+    def percentile(self, p):
+        ''' Upper bound of the bucket holding the nearest-rank p-th percentile (at most max)'''
+        rank, seen = max(1, math.ceil(p / 100 * self.count)), 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank: return min(BUCKET_FLOOR_S * BUCKET_GROWTH ** bucket, self.max)
+        return self.max
+
+
+def start(run_dir = None, profile = False):
+    '''
+    Starts a run, unless one is already active (e.g. in a stage process
+    started by pipeline.py). Returns the run directory
+    '''
+    global _run_dir
+    if enabled(): return _run_dir
+    run_dir = os.path.abspath(run_dir or os.path.join(REPORT_ROOT, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"))
+    os.makedirs(run_dir, exist_ok = True)
+    os.environ[RUN_DIR_ENV] = _run_dir = run_dir
+    if profile: os.environ[PROFILE_ENV] = '1'
+    return run_dir
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _local()[self.name].add(time.perf_counter() - self.start)
+
+
+def timer(name):
+    ''' Context manager timing one call of name (no-op outside a run)'''
+    return _Timer(name) if enabled() else _NO_TIMER
+
+
+def record(name, seconds):
+    if enabled(): _local()[name].add(seconds)
+
+
+def flush():
+    ''' Appends this process' timer stats to its file in the run directory'''
+    samples = _local()
+    if not enabled() or not samples: return
+    path = os.path.join(_run_dir, f'samples-{os.getpid()}.jsonl')
+    timers = {name: stats.to_dict() for name, stats in samples.items()}
+    line = json.dumps({'stage': os.environ.get(STAGE_ENV, 'main'), 'timers': timers})
+    with open(path, 'a') as f: f.write(line + '\n')
+    samples.clear()
+
+
+def run_stage(name, fn, *args, **kwargs):
+    '''
+    Runs fn(*args, **kwargs) as stage name: its timers and its workers' are
+    reported under name, the whole call is timed as 'stage', and with
+    profiling on the call is profiled into <run dir>/<name>.prof.
+    Outside a run (a script run on its own) it starts one and writes the report
+    '''
+    standalone = not enabled()
+    if standalone: start()
+    os.environ[STAGE_ENV] = name  # before fn forks its workers
+    profiler = cProfile.Profile() if os.environ.get(PROFILE_ENV) == '1' else None
+    try:
+        with timer('stage'):
+            if profiler: profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if profiler:
+                    profiler.disable()
+                    profiler.dump_stats(os.path.join(_run_dir, f'{name}.prof'))
+    finally:
+        flush()
+        if standalone: report()
+
+
+# REPORT
+def summarize(stats):
+    ''' count, total and latency percentiles (nearest rank, within BUCKET_GROWTH) of a _Stats'''
+    out = {
+        'count': stats.count,
+        'total_s': round(stats.total, 6),
+        'mean_ms': round(stats.total / stats.count * 1000, 3),
+        'max_ms': round(stats.max * 1000, 3)
+    }
+    for p in PERCENTILES:
+        out[f'p{p}_ms'] = round(stats.percentile(p) * 1000, 3)
+    return out
+
+
+def merged_samples(run_dir):
+    ''' {stage: {timer: _Stats}} over every process of the run'''
+    merged = defaultdict(lambda: defaultdict(_Stats))
+    for path in glob.glob(os.path.join(run_dir, 'samples-*.jsonl')):
+        with open(path, 'r') as f:
+            for line in f:
+                entry = json.loads(line)
+                for name, stats in entry['timers'].items():
+                    merged[entry['stage']][name].merge(stats)
+    return merged
+
+
+def report(path = None):
+    '''
+    Merges the samples of every process of the active run, writes them as
+    JSON (default: <run dir>/report.json), prints a table. Returns the report dict
+    '''
+    flush()
+    run_dir = _run_dir
+    stages = {
+        stage: {name: summarize(stats) for name, stats in sorted(timers.items())}
+        for stage, timers in sorted(merged_samples(run_dir).items())
+    }
+    result = {
+        'run_dir': run_dir,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'stages': stages,
+        'profiles': sorted(glob.glob(os.path.join(run_dir, '*.prof')))
+    }
+    path = path or os.path.join(run_dir, 'report.json')
+    with open(path, 'w') as f: json.dump(result, f, indent = 2)
+
+    print(f'{"stage":<10} {"timer":<28} {"count":>8} {"total s":>9} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9}')
+    for stage, timers in stages.items():
+        for name, s in timers.items():
+            print(f'{stage:<10} {name:<28} {s["count"]:>8} {s["total_s"]:>9.2f} {s["p50_ms"]:>9.2f} {s["p90_ms"]:>9.2f} {s["p99_ms"]:>9.2f}')
+    print(f'Timing report saved {path}')
+    return result
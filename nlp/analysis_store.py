@@ -0,0 +1,168 @@
+"""
+Per-ad store for incremental OCR-text analysis.
+
+Rows are keyed by ad_id and remember a hash of the ocr_text they were
+computed from, so a run only re-analyzes ads whose text is new or changed.
+Between runs the store also keeps what TF-IDF needs:
+- the fitted vectorizer (pickled), used to transform new documents
+- corpus-wide term counts and document frequencies, updated per ad as
+  texts come, change and go, so vocabulary drift can be measured without
+  refitting
+
+Everything lives in one SQLite file, together with a fingerprint of the
+analysis settings; a store written with different settings is cleared.
+"""
+
+import hashlib
+import json
+import pickle
+import sqlite3
+from collections import Counter
+
+
+def text_hash(text: str) -> str:
+    """Content hash of an ad's OCR text."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class AnalysisStore:
+    def __init__(self, path, settings: dict | None = None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS ads (
+        ad_id TEXT PRIMARY KEY,
+        text_hash TEXT NOT NULL,
+        polarity REAL NOT NULL,
+        subjectivity REAL NOT NULL,
+        top_words TEXT NOT NULL,
+        top_keywords TEXT NOT NULL,
+        terms TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS terms (
+        term TEXT PRIMARY KEY,
+        tf INTEGER NOT NULL,
+        df INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+        name TEXT PRIMARY KEY,
+        value BLOB
+        );
+        ''')
+        self.conn.commit()
+        if settings is not None:
+            self._check_settings(settings)
+
+    def _check_settings(self, settings: dict):
+        fingerprint = json.dumps(settings, sort_keys=True, default=str)
+        found = self.conn.execute("SELECT value FROM meta WHERE name = 'settings'").fetchone()
+        if found is None or found[0] != fingerprint:
+            self.clear()
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (fingerprint,))
+
+    def hashes(self) -> dict[str, str]:
+        """{ad_id: text_hash} of every stored ad."""
+        return dict(self.conn.execute('SELECT ad_id, text_hash FROM ads'))
+
+    def _update_terms(self, added: list[Counter], removed: list[Counter]):
+        tf, df = Counter(), Counter()
+        for terms, sign in [(t, 1) for t in added] + [(t, -1) for t in removed]:
+            for term, count in terms.items():
+                tf[term] += sign * count
+                df[term] += sign
+        self.conn.executemany(
+            'INSERT INTO terms VALUES (?,?,?) '
+            'ON CONFLICT(term) DO UPDATE SET tf = tf + excluded.tf, df = df + excluded.df',
+            [(term, tf[term], df[term]) for term in tf if tf[term] or df[term]]
+        )
+        self.conn.execute('DELETE FROM terms WHERE df <= 0')
+
+    def _stored_terms(self, ad_ids) -> list[Counter]:
+        out = []
+        for ad_id in ad_ids:
+            found = self.conn.execute('SELECT terms FROM ads WHERE ad_id = ?', (ad_id,)).fetchone()
+            if found is not None:
+                out.append(Counter(json.loads(found[0])))
+        return out
+
+    def put(self, rows: list[tuple]):
+        """Inserts or replaces analyzed ads.
+
+        rows: (ad_id, text_hash, polarity, subjectivity, top_words, terms), with
+        top_words a list and terms a Counter of the TF-IDF analyzer's tokens.
+        Keywords are set separately (set_keywords), once TF-IDF has run.
+        """
+        with self.conn:
+            ad_ids = [str(r[0]) for r in rows]
+            self._update_terms([r[5] for r in rows], self._stored_terms(ad_ids))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO ads VALUES (?,?,?,?,?,?,?)',
+                [
+                    (ad_id, h, p, s, '|'.join(words), '', json.dumps(terms))
+                    for ad_id, (_, h, p, s, words, terms) in zip(ad_ids, rows)
+                ]
+            )
+
+    def remove(self, ad_ids):
+        ad_ids = [str(a) for a in ad_ids]
+        with self.conn:
+            self._update_terms([], self._stored_terms(ad_ids))
+            self.conn.executemany('DELETE FROM ads WHERE ad_id = ?', [(a,) for a in ad_ids])
+
+    def set_keywords(self, keywords: dict):
+        """keywords: {ad_id: [keyword, ...]}"""
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE ads SET top_keywords = ? WHERE ad_id = ?',
+                [('|'.join(words), str(ad_id)) for ad_id, words in keywords.items()]
+            )
+
+    def rows(self) -> dict[str, tuple]:
+        """{ad_id: (polarity, subjectivity, top_words, top_keywords)}, lists '|'-joined."""
+        return {
+            ad_id: rest for ad_id, *rest in self.conn.execute(
+                'SELECT ad_id, polarity, subjectivity, top_words, top_keywords FROM ads'
+            )
+        }
+
+    def top_terms(self, n: int) -> list[str]:
+        """The n most frequent terms, ranked like TfidfVectorizer(max_features=n)."""
+        return [t for t, in self.conn.execute('SELECT term FROM terms ORDER BY tf DESC, term LIMIT ?', (n,))]
+
+    def vocabulary_drift(self, vocabulary) -> float:
+        """Share of a fitted vocabulary that is no longer among the corpus' top terms."""
+        if not vocabulary:
+            return 1.0
+        current = set(self.top_terms(len(vocabulary)))
+        return 1.0 - len(current & set(vocabulary)) / len(vocabulary)
+
+    def has_vectorizer(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM meta WHERE name = 'vectorizer'").fetchone() is not None
+
+    def load_vectorizer(self):
+        """The saved fitted vectorizer, or None (also if it no longer unpickles)."""
+        found = self.conn.execute("SELECT value FROM meta WHERE name = 'vectorizer'").fetchone()
+        if found is None:
+            return None
+        try:
+            return pickle.loads(found[0])
+        except Exception:
+            return None
+
+    def save_vectorizer(self, vec):
+        # stop_words_ holds every term cut by max_features and is only for introspection
+        if hasattr(vec, 'stop_words_'):
+            del vec.stop_words_
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('vectorizer', ?)", (pickle.dumps(vec),))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute('DELETE FROM ads')
+            self.conn.execute('DELETE FROM terms')
+            self.conn.execute("DELETE FROM meta WHERE name = 'vectorizer'")
+
+    def close(self):
+        self.conn.close()
@@ -3,103 +3,220 @@ Analyzes OCR text from collected_ads_enriched.csv:
 - Sentiment
 - Top words (by frequency, stopwords removed)
 - Top keywords (TF-IDF)
+
+Runs are incremental: per-ad results live in nlp/analysis_store.sqlite keyed
+by a hash of the OCR text, so only new or changed ads are re-analyzed, and
+TF-IDF is refit only when the corpus vocabulary drifts (--full recomputes
+everything).
+
+Startup is kept cheap: nothing is downloaded (the English stopword list and
+sentiment lexicon ship in nlp/resources/, and NLTK is not used) and pandas,
+NumPy and scikit-learn are imported by the step that uses them. Check the import cost with
+benchmarks/bench_nlp_cold_start.py.
 """
 
-import pandas as pd
 from collections import Counter
-from pathlib import Path
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-# NLP imports (install: pip install textblob nltk scikit-learn)
-from textblob import TextBlob
-import nltk
-from sklearn.feature_extraction.text import TfidfVectorizer
+from project_paths import PROJECT_ROOT  # also makes the project root's modules importable
+import columnar  # Parquet copies of the CSV hand-offs, when pyarrow is installed
+import instrumentation
+# NLP dependencies (install: pip install pandas scikit-learn),
+# imported lazily below
+from batch_analyzer import analyze_texts
 
-# Download NLTK data once
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+if TYPE_CHECKING:
+    import numpy as np
 
 # Paths
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
 INPUT_CSV = PROJECT_ROOT / 'collected_ads_enriched.csv'
 OUTPUT_CSV = PROJECT_ROOT / 'nlp' / 'image_text_analysis.csv'
+STOPWORDS_FILE = PROJECT_ROOT / 'nlp' / 'resources' / 'stopwords_english.txt'  # NLTK's English list
+ANALYSIS_DB = PROJECT_ROOT / 'nlp' / 'analysis_store.sqlite'
 
 # Config
 MIN_WORDS = 3  # Skip rows with fewer words
 TOP_N_WORDS = 3
 TOP_N_KEYWORDS = 3
-STOP_WORDS = set(stopwords.words('english'))
+TFIDF_MAX_FEATURES = 500
+VOCAB_DRIFT_THRESHOLD = 0.05  # refit TF-IDF once this share of its vocabulary left the top terms
+NLP_WORKERS = None  # process pool size for sentiment/top words; None = all cores
+
+
+@lru_cache(maxsize=None)
+def stop_words() -> frozenset:
+    """English stopwords, read once from the bundled list."""
+    return frozenset(STOPWORDS_FILE.read_text(encoding='utf-8').split())
+
+
+def top_k_per_row(matrix, k: int) -> 'np.ndarray':
+    """Column indices of the k largest positive entries of each row, largest first.
+
+    Works on the CSR indptr/indices/data arrays directly: k vectorized passes
+    over the nonzeros, each picking every row's maximum with np.maximum.reduceat.
+    Ties go to the higher column index, i.e. the same result as
+    row.argsort(kind='stable')[-k:][::-1] on the dense row.
+    Returns an (n_rows, k) int array, padded with -1 where a row has fewer entries.
+    """
+    import numpy as np
+
+    m = matrix.tocsr()
+    if not m.has_sorted_indices:
+        m = m.sorted_indices()
+    n_rows = m.shape[0]
+    counts = np.diff(m.indptr)
+    nonempty = counts > 0
+    starts = m.indptr[:-1][nonempty]
+    row_of = np.repeat(np.arange(n_rows), counts)
+    vals = np.where(m.data > 0, m.data, -np.inf)
+    pos = np.arange(len(vals))
+
+    top = np.full((n_rows, k), -1, dtype=np.int64)
+    if not len(vals):
+        return top
+    row_max = np.full(n_rows, -np.inf)
+    last = np.full(n_rows, -1)
+    for j in range(k):
+        row_max[nonempty] = np.maximum.reduceat(vals, starts)
+        hit = (vals == row_max[row_of]) & np.isfinite(vals)
+        # indices are sorted within a row, so the last hit has the highest column
+        last[nonempty] = np.maximum.reduceat(np.where(hit, pos, -1), starts)
+        found = last >= 0
+        top[found, j] = m.indices[last[found]]
+        vals[last[found]] = -np.inf
+    return top
+
+
+def make_vectorizer():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(max_features=TFIDF_MAX_FEATURES, stop_words='english')
+
+
+def keywords_from_tfidf(tfidf, vec, texts: list, n: int = TOP_N_KEYWORDS) -> list[list[str]]:
+    """Top N keywords per row of a TF-IDF matrix (empty for blank texts)."""
+    feature_names = vec.get_feature_names_out()
+    top = top_k_per_row(tfidf, n).tolist()
+    return [
+        [feature_names[i] for i in top[idx] if i >= 0] if texts[idx].strip() else []
+        for idx in range(len(texts))
+    ]
 
 
-def get_sentiment(text: str) -> dict:
-    """Returns polarity (-1 to 1) and subjectivity (0 to 1)."""
-    blob = TextBlob(text)
-    return {
-        'polarity': round(blob.sentiment.polarity, 4),
-        'subjectivity': round(blob.sentiment.subjectivity, 4),
-    }
+def chunked_keywords(vec, texts: list, n: int = TOP_N_KEYWORDS) -> list[list[str]]:
+    """Top N keywords per text, transformed with a fitted vectorizer one chunk at a time."""
+    from streaming_tfidf import chunk_keywords, in_chunks
+
+    return [keywords for chunk in in_chunks(texts) for keywords in chunk_keywords(vec, chunk, n)]
+
 
+def fit_keywords(texts: list, n: int = TOP_N_KEYWORDS):
+    """Fits TF-IDF chunk by chunk (StreamingTfidf); returns (vectorizer, top N keywords per text)."""
+    from streaming_tfidf import StreamingTfidf, in_chunks
 
-def get_top_words(text: str, n: int = TOP_N_WORDS) -> list:
-    """Tokenize, remove stopwords, return top N by frequency."""
-    words = word_tokenize(text.lower())
-    words = [w for w in words if w.isalnum() and w not in STOP_WORDS and len(w) > 1]
-    counts = Counter(words)
-    return [word for word, _ in counts.most_common(n)]
+    vec = StreamingTfidf().fit(in_chunks(texts))
+    return vec, chunked_keywords(vec, texts, n)
 
 
 def get_top_keywords_for_all(texts: list, n: int = TOP_N_KEYWORDS) -> list[list[str]]:
     """Fit TF-IDF once, return top N keywords per document."""
     if not texts:
         return []
-    vec = TfidfVectorizer(max_features=500, stop_words='english')
-    tfidf = vec.fit_transform(texts)
-    feature_names = vec.get_feature_names_out()
-    results = []
-    for idx in range(len(texts)):
-        if not texts[idx].strip():
-            results.append([])
-            continue
-        row = tfidf[idx].toarray().flatten()
-        top_indices = row.argsort()[-n:][::-1]
-        keywords = [feature_names[i] for i in top_indices if row[i] > 0]
-        results.append(keywords)
-    return results
-
-
-def main():
-    df = pd.read_csv(INPUT_CSV)
+    return fit_keywords(texts, n)[1]
+
+
+def analyze(ad_ids: list, texts: list, store, full: bool = False) -> dict:
+    """Brings the store up to date with these ads; returns {ad_id: stored row}.
+
+    Sentiment and top words are computed only for ads whose text hash is new
+    or changed. TF-IDF is refit on all texts when there is no saved vectorizer
+    or its vocabulary drifted past VOCAB_DRIFT_THRESHOLD; otherwise only the
+    new texts are transformed with the saved one. Both go through
+    streaming_tfidf, a chunk of texts at a time. full=True starts over.
+    """
+    from analysis_store import text_hash
+
+    if full:
+        store.clear()
+    ad_ids = [str(a) for a in ad_ids]
+    hashes = [text_hash(t) for t in texts]
+    known = store.hashes()
+    changed = [i for i, (ad_id, h) in enumerate(zip(ad_ids, hashes)) if known.get(ad_id) != h]
+    gone = known.keys() - set(ad_ids)
+    print(f"{len(changed)} new or changed ads, {len(gone)} removed, {len(texts) - len(changed)} unchanged")
+    store.remove(gone)
+    if not changed and not gone and store.has_vectorizer():
+        return store.rows()
+
+    print("Computing sentiment and top words...")
+    new_texts = [texts[i] for i in changed]
+    analyzed = analyze_texts(new_texts, stop_words(), TOP_N_WORDS, workers=NLP_WORKERS)
+    analyzer = make_vectorizer().build_analyzer()
+    store.put([
+        (ad_ids[i], hashes[i], polarity, subjectivity, top_words, Counter(analyzer(texts[i])))
+        for i, (polarity, subjectivity, top_words) in zip(changed, analyzed)
+    ])
+
+    vec = store.load_vectorizer()
+    drift = store.vocabulary_drift(vec.vocabulary_) if vec is not None else 1.0
+    if drift > VOCAB_DRIFT_THRESHOLD:
+        # Fit TF-IDF once (avoids 4k+ fits and memory blowup)
+        print(f"Computing keywords (TF-IDF refit, vocabulary drift {drift:.1%})...")
+        if texts:
+            vec, keywords = fit_keywords(texts)
+            store.save_vectorizer(vec)
+            store.set_keywords(dict(zip(ad_ids, keywords)))
+    elif changed:
+        print(f"Computing keywords (saved TF-IDF, vocabulary drift {drift:.1%})...")
+        keywords = chunked_keywords(vec, new_texts)
+        store.set_keywords({ad_ids[i]: kw for i, kw in zip(changed, keywords)})
+    return store.rows()
+
+
+def main(full: bool = False):
+    import pandas as pd
+    from analysis_store import AnalysisStore
+
+    with instrumentation.timer('csv.read'):
+        df = columnar.read_frame(INPUT_CSV, columns=['ad_id', 'ocr_text', 'ocr_word_count'])
     # Filter: only rows with meaningful OCR text
     mask = df['ocr_text'].notna() & (df['ocr_word_count'] >= MIN_WORDS)
     df_text = df[mask].copy()
 
     texts = df_text['ocr_text'].fillna('').astype(str).tolist()
 
-    # Fit TF-IDF once (avoids 4k+ fits and memory blowup)
-    print("Computing keywords (TF-IDF)...")
-    all_keywords = get_top_keywords_for_all(texts)
+    settings = {
+        'top_n_words': TOP_N_WORDS,
+        'top_words_tokenizer': 'pattern.find_tokens',
+        'top_n_keywords': TOP_N_KEYWORDS,
+        'max_features': TFIDF_MAX_FEATURES,
+        'stop_words': sorted(stop_words()),
+    }
+    store = AnalysisStore(ANALYSIS_DB, settings)
+    rows = analyze(df_text['ad_id'].tolist(), texts, store, full=full)
+    store.close()
 
     results = []
-    for pos, (_, row) in enumerate(df_text.iterrows()):
-        text = row['ocr_text']
-        sentiment = get_sentiment(text)
-        top_words = get_top_words(text)
-        top_keywords = all_keywords[pos]
-
+    for ad_id, text in zip(df_text['ad_id'], texts):
+        polarity, subjectivity, top_words, top_keywords = rows[str(ad_id)]
         results.append({
-            'ad_id': row['ad_id'],
+            'ad_id': ad_id,
             'ocr_text': text[:200] + '...' if len(text) > 200 else text,
-            'sentiment_polarity': sentiment['polarity'],
-            'sentiment_subjectivity': sentiment['subjectivity'],
-            'top_words': '|'.join(top_words),
-            'top_keywords': '|'.join(top_keywords),
+            'sentiment_polarity': polarity,
+            'sentiment_subjectivity': subjectivity,
+            'top_words': top_words,
+            'top_keywords': top_keywords,
         })
 
     out_df = pd.DataFrame(results)
-    out_df.to_csv(OUTPUT_CSV, index=False)
+    with instrumentation.timer('csv.write'):
+        out_df.to_csv(OUTPUT_CSV, index=False)
+        columnar.write_copy(OUTPUT_CSV)
     print(f"Saved {len(out_df)} rows to {OUTPUT_CSV}")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    import sys
+
+    instrumentation.run_stage('nlp', main, full='--full' in sys.argv[1:])
@@ -0,0 +1,19 @@
+"""
+Makes the project root importable from nlp/ and strategy clustering/.
+
+Scripts there run with their own directory on sys.path. Importing this
+module first puts the project root there too, so the root's modules
+(columnar, instrumentation, data_store) are imported the same way the root
+scripts import them:
+
+    import project_paths  # noqa: F401
+    import columnar
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
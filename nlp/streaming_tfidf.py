@@ -0,0 +1,139 @@
+"""
+Out-of-core TF-IDF keywords for corpora that don't fit in memory.
+
+StreamingTfidf is the TF-IDF fit used by analyze_image_text's keywords and
+by strategy clustering's text features: it is fit on chunks of texts and
+transforms one chunk at a time. stream_keywords() goes further and reads
+the corpus itself in column-projected chunks (only ad_id, ocr_text and
+ocr_word_count are parsed into memory), in two streaming passes:
+
+1. count term totals and document frequencies chunk by chunk, then pick the
+   vocabulary and idf exactly like TfidfVectorizer(max_features, min_df)
+2. re-read the chunks, weight them with that vocabulary and idf, and append
+   each chunk's top keywords to the output CSV
+
+Peak memory depends on the chunk size and the number of distinct terms, not
+on the number of ads. Keywords match get_top_keywords_for_all() on the same
+texts.
+
+Run from the project root:
+    python3 nlp/streaming_tfidf.py [chunk_size]
+"""
+
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from project_paths import PROJECT_ROOT  # also makes the project root's modules importable
+import columnar
+from analyze_image_text import (
+    INPUT_CSV, MIN_WORDS, TFIDF_MAX_FEATURES, TOP_N_KEYWORDS, keywords_from_tfidf,
+)
+
+OUTPUT_CSV = PROJECT_ROOT / 'nlp' / 'streaming_keywords.csv'
+CHUNK_SIZE = 5000
+COLUMNS = ['ad_id', 'ocr_text', 'ocr_word_count']
+
+
+def in_chunks(items: list, chunk_size: int = CHUNK_SIZE):
+    """Consecutive chunk_size slices of an in-memory list."""
+    return (items[i:i + chunk_size] for i in range(0, len(items), chunk_size))
+
+
+def iter_chunks(path=INPUT_CSV, chunk_size: int = CHUNK_SIZE, min_words: int = MIN_WORDS):
+    """Yields (ad_ids, texts) per chunk of ads with meaningful OCR text (Parquet copy if current)."""
+    for chunk in columnar.iter_frames(path, columns=COLUMNS, chunk_size=chunk_size):
+        chunk = chunk[chunk['ocr_text'].notna() & (chunk['ocr_word_count'] >= min_words)]
+        yield chunk['ad_id'].tolist(), chunk['ocr_text'].astype(str).tolist()
+
+
+class StreamingTfidf:
+    """TfidfVectorizer(max_features, min_df, stop_words) fit on a stream of text chunks.
+
+    fit() keeps only per-term totals across chunks; transform() works on one
+    chunk at a time. Default TfidfVectorizer weighting: smooth idf, l2 norm.
+    """
+
+    def __init__(self, max_features: int | None = TFIDF_MAX_FEATURES, min_df: int = 1,
+                 stop_words='english'):
+        self.max_features = max_features
+        self.min_df = min_df
+        self.stop_words = stop_words
+
+    def fit(self, text_chunks) -> 'StreamingTfidf':
+        """First pass: term totals and document frequencies, then vocabulary and idf."""
+        tf, df = {}, {}
+        n_docs = 0
+        for texts in text_chunks:
+            if not texts:
+                continue
+            n_docs += len(texts)
+            counts = CountVectorizer(stop_words=self.stop_words)
+            try:
+                X = counts.fit_transform(texts)
+            except ValueError:  # only stop words in this chunk
+                continue
+            chunk_tf = np.asarray(X.sum(axis=0)).ravel()
+            chunk_df = np.diff(X.tocsc().indptr)
+            for term, j in counts.vocabulary_.items():
+                tf[term] = tf.get(term, 0) + int(chunk_tf[j])
+                df[term] = df.get(term, 0) + int(chunk_df[j])
+        if not n_docs:
+            raise ValueError('no documents to fit')
+
+        # same selection as CountVectorizer._limit_features, on alphabetically sorted terms
+        terms = np.array(sorted(tf))
+        tfs = np.array([tf[t] for t in terms])
+        dfs = np.array([df[t] for t in terms])
+        keep = dfs >= self.min_df
+        terms, tfs, dfs = terms[keep], tfs[keep], dfs[keep]
+        if self.max_features is not None and len(terms) > self.max_features:
+            top = np.sort((-tfs).argsort()[:self.max_features])
+            terms, dfs = terms[top], dfs[top]
+
+        self.n_docs_ = n_docs
+        self.vocabulary_ = {t: i for i, t in enumerate(terms.tolist())}
+        self.idf_ = np.log((1 + n_docs) / (1 + dfs)) + 1
+        self._counter = CountVectorizer(stop_words=self.stop_words, vocabulary=self.vocabulary_)
+        return self
+
+    def get_feature_names_out(self) -> np.ndarray:
+        return self._counter.get_feature_names_out()
+
+    def transform(self, texts: list):
+        """l2-normalized TF-IDF rows (CSR) of one chunk of texts."""
+        X = self._counter.transform(texts).astype(np.float64)
+        return normalize(X.multiply(self.idf_).tocsr())
+
+
+def chunk_keywords(tfidf: StreamingTfidf, texts: list, n: int = TOP_N_KEYWORDS) -> list[list[str]]:
+    if not texts:
+        return []
+    return keywords_from_tfidf(tfidf.transform(texts), tfidf, texts, n)
+
+
+def stream_keywords(input_csv=INPUT_CSV, output_csv=OUTPUT_CSV, chunk_size: int = CHUNK_SIZE,
+                    n: int = TOP_N_KEYWORDS) -> int:
+    """Writes ad_id,top_keywords for every ad with OCR text; returns the row count."""
+    tfidf = StreamingTfidf().fit(texts for _, texts in iter_chunks(input_csv, chunk_size))
+    print(f"Vocabulary: {len(tfidf.vocabulary_)} terms from {tfidf.n_docs_} ads")
+
+    written = 0
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ad_id', 'top_keywords'])
+        for ad_ids, texts in iter_chunks(input_csv, chunk_size):
+            keywords = chunk_keywords(tfidf, texts, n)
+            writer.writerows((ad_id, '|'.join(words)) for ad_id, words in zip(ad_ids, keywords))
+            written += len(ad_ids)
+    return written
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else CHUNK_SIZE
+    rows = stream_keywords(chunk_size=size)
+    print(f"Saved {rows} rows to {Path(OUTPUT_CSV)}")
@@ -0,0 +1,158 @@
+'''
+NumPy dominant color extraction.
+
+Drop-in for ColorThief.get_palette(quality = 1): the same modified median-cut
+(MMCQ) over a 5-bit-per-channel color histogram, but the histogram is built
+with one np.bincount over a downsampled pixel array and every box statistic is
+a vectorized reduction over that histogram instead of a Python loop per pixel.
+'''
+
+import math
+
+import numpy as np
+from PIL import Image
+
+
+# MMCQ SETTINGS (same as colorthief)
+SIGBITS = 5
+RSHIFT = 8 - SIGBITS
+HIST_SIDE = 1 << SIGBITS
+FRACT_BY_POPULATIONS = 0.75
+MAX_ITERATION = 1000
+
+# pixels sampled per image; a 1024x768 ad is strided down to ~this many
+DEFAULT_PIXEL_BUDGET = 65536
+
+# colorthief ignores transparent and near-white pixels
+MIN_ALPHA = 125
+WHITE_LEVEL = 250
+
+_CENTERS = (np.arange(HIST_SIDE) + 0.5) * (1 << RSHIFT)
+
+
+def sample_pixels(image, pixel_budget = DEFAULT_PIXEL_BUDGET):
+    '''
+    Returns an (N, 3) uint8 array of the pixels colorthief would count,
+    taken on a regular grid so that N <= pixel_budget
+    '''
+    if image.mode not in ('RGB', 'RGBA'): image = image.convert('RGBA')
+    arr = np.asarray(image)
+
+    h, w = arr.shape[:2]
+    step = 1
+    if pixel_budget and h * w > pixel_budget:
+        step = int(np.ceil(np.sqrt(h * w / pixel_budget)))
+    arr = arr[::step, ::step].reshape(-1, arr.shape[2])
+
+    keep = ~np.all(arr[:, :3] > WHITE_LEVEL, axis = 1)
+    if arr.shape[1] == 4: keep &= arr[:, 3] >= MIN_ALPHA
+    return arr[keep, :3]
+
+
+def color_histogram(pixels):
+    ''' 32x32x32 pixel counts indexed [r, g, b] on the 5-bit quantized channels'''
+    q = (pixels >> RSHIFT).astype(np.intp)
+    idx = (q[:, 0] << (2 * SIGBITS)) | (q[:, 1] << SIGBITS) | q[:, 2]
+    return np.bincount(idx, minlength = HIST_SIDE ** 3).reshape(HIST_SIDE, HIST_SIDE, HIST_SIDE)
+
+
+class _Box:
+    ''' Inclusive [lo, hi] bounds per channel over the quantized histogram'''
+    __slots__ = ('lo', 'hi', 'count')
+
+    def __init__(self, hist, lo, hi):
+        self.lo = lo
+        self.hi = hi
+        self.count = int(self.view(hist).sum())
+
+    def view(self, hist):
+        (r1, g1, b1), (r2, g2, b2) = self.lo, self.hi
+        return hist[r1:r2 + 1, g1:g2 + 1, b1:b2 + 1]
+
+    @property
+    def volume(self):
+        return int(np.prod([h - l + 1 for l, h in zip(self.lo, self.hi)]))
+
+    def color(self, hist):
+        sub = self.view(hist)
+        if not self.count:
+            return tuple(int((1 << RSHIFT) * (l + h + 1) / 2) for l, h in zip(self.lo, self.hi))
+        rgb = []
+        for axis in range(3):
+            others = tuple(a for a in range(3) if a != axis)
+            per_plane = sub.sum(axis = others)
+            centers = _CENTERS[self.lo[axis]:self.hi[axis] + 1]
+            rgb.append(int((per_plane * centers).sum() / self.count))
+        return tuple(rgb)
+
+
+def _median_cut(hist, box):
+    ''' Splits box along its widest channel at the population median (MMCQ cut rule)'''
+    if box.count <= 1: return box, None
+
+    widths = [h - l + 1 for l, h in zip(box.lo, box.hi)]
+    axis = int(np.argmax(widths))
+    others = tuple(a for a in range(3) if a != axis)
+    partial = np.cumsum(box.view(hist).sum(axis = others))
+    total = int(partial[-1])
+
+    lo, hi = box.lo[axis], box.hi[axis]
+    i = int(np.argmax(partial > total / 2))
+    left, right = i, (hi - lo) - i
+    if left <= right: cut = min(hi - lo - 1, int(i + right / 2))
+    else: cut = max(0, int(i - 1 - left / 2))
+
+    # avoid 0-count boxes
+    while cut < len(partial) - 1 and not partial[cut]: cut += 1
+    while cut > 0 and partial[cut] == total and partial[cut - 1]: cut -= 1
+    if cut >= hi - lo: return box, None
+
+    hi1 = list(box.hi)
+    hi1[axis] = lo + cut
+    lo2 = list(box.lo)
+    lo2[axis] = lo + cut + 1
+    return _Box(hist, box.lo, tuple(hi1)), _Box(hist, tuple(lo2), box.hi)
+
+
+def _split_until(hist, boxes, target, key):
+    ''' Repeatedly cuts the box with the largest key until there are target boxes'''
+    final = []  # boxes that cannot be cut any further
+    n_iter = 0
+    while boxes and len(boxes) + len(final) < target and n_iter < MAX_ITERATION:
+        n_iter += 1
+        box = max(boxes, key = key)
+        boxes.remove(box)
+        b1, b2 = _median_cut(hist, box)
+        if b2 is None: final.append(box)
+        else: boxes.extend([b1, b2])
+    return boxes + final
+
+
+def quantize(pixels, n_colors = 5):
+    '''
+    Median-cut palette of an (N, 3) uint8 pixel array.
+    Returns up to n_colors (R,G,B) tuples ordered like colorthief
+    (pixel count x box volume, largest first)
+    '''
+    if len(pixels) == 0: return []
+    hist = color_histogram(pixels)
+
+    occupied = np.nonzero(hist)
+    lo = tuple(int(a.min()) for a in occupied)
+    hi = tuple(int(a.max()) for a in occupied)
+    boxes = [_Box(hist, lo, hi)]
+
+    boxes = _split_until(hist, boxes, math.ceil(FRACT_BY_POPULATIONS * n_colors), key = lambda b: b.count)
+    boxes = _split_until(hist, boxes, n_colors, key = lambda b: b.count * b.volume)
+
+    boxes.sort(key = lambda b: b.count * b.volume, reverse = True)
+    return [box.color(hist) for box in boxes]
+
+
+def get_palette(image, n_colors = 5, pixel_budget = DEFAULT_PIXEL_BUDGET):
+    '''
+    image: path or decoded PIL image
+    Returns list of (R,G,B) tuples, most dominant first
+    '''
+    if not isinstance(image, Image.Image): image = Image.open(image)
+    return quantize(sample_pixels(image, pixel_budget), n_colors)
@@ -0,0 +1,277 @@
+'''
+One entry point for the whole pipeline:
+
+    collect -> extract -> store
+                       -> nlp -> cluster
+
+    python pipeline.py                  # every stage that is out of date
+    python pipeline.py nlp              # nlp and whatever it depends on
+    python pipeline.py --force extract  # re-run extract (and what it invalidates)
+    python pipeline.py nlp --force      # re-run nlp only; extract runs if out of date
+    python pipeline.py --dry-run        # only show what would run
+
+Each stage lists its code, input and output files. A run records a
+fingerprint of them in STATE_FILE, and a stage is skipped while its code
+(content hash) and inputs (size + mtime) are unchanged and its outputs are
+still the ones it wrote. Stages run in their own process, as soon as every
+stage they depend on has finished, so independent stages (store and nlp)
+run side by side.
+
+Every run that executes stages writes a timing report (instrumentation.py)
+covering all stage and worker processes; --profile adds a cProfile dump per
+stage.
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import runpy
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(ROOT, 'pipeline_state.json')
+NLP_DIR = os.path.join(ROOT, 'nlp')
+CLUSTER_DIR = os.path.join(ROOT, 'strategy clustering')
+
+
+# STAGE RUNNERS (called in the stage's own process, cwd = ROOT)
+def run_collect():
+    import data_collect
+    data_collect.collect()
+
+def run_extract():
+    import extraction
+    extraction.extract_all()
+
+def run_store():
+    import data_store
+    data_store.fill_database()
+
+def run_nlp():
+    sys.path.insert(0, NLP_DIR)
+    import analyze_image_text
+    analyze_image_text.main()
+
+def run_cluster():
+    # notebook export: the whole script is the stage
+    sys.path.insert(0, CLUSTER_DIR)
+    runpy.run_path(os.path.join(CLUSTER_DIR, 'strategy_clustering.py'), run_name = '__main__')
+
+
+def image_folders():
+    ''' Image folders data_collect reads; a folder's mtime changes when images are added or removed'''
+    import data_collect
+    folders = data_collect.FOLDERS
+    if folders is None: folders = [d for d in os.listdir(ROOT) if d.isdigit()]
+    return [os.path.join(data_collect.BASE_DIR, folder) for folder in folders]
+
+
+# STAGES (paths relative to ROOT)
+STAGES = {
+    'collect': {
+        'after': [],
+        'code': ['data_collect.py', 'annotation_index.py'],
+        'inputs': ['Symbols.json', 'Topics.json', 'Sentiments.json', 'Topics_List.txt', 'Sentiments_List.txt'],
+        'extra_inputs': image_folders,
+        'outputs': ['collected_ads.csv'],
+        'run': run_collect
+    },
+    'extract': {
+        'after': ['collect'],
+        'code': ['extraction.py', 'helpers.py', 'palette.py', 'feature_cache.py', 'columnar.py'],
+        'inputs': ['collected_ads.csv'],
+        'outputs': ['collected_ads_enriched.csv'],
+        'run': run_extract
+    },
+    'store': {
+        'after': ['extract'],
+        'code': ['data_store.py'],
+        'inputs': ['collected_ads_enriched.csv'],
+        'outputs': ['ads.sqlite'],
+        'run': run_store
+    },
+    'nlp': {
+        'after': ['extract'],
+        'code': ['nlp/analyze_image_text.py', 'nlp/batch_analyzer.py', 'nlp/analysis_store.py',
+                 'nlp/streaming_tfidf.py', 'nlp/project_paths.py', 'nlp/resources/stopwords_english.txt',
+                 'nlp/resources/en-sentiment.xml', 'columnar.py'],
+        'inputs': ['collected_ads_enriched.csv'],
+        'outputs': ['nlp/image_text_analysis.csv'],
+        'run': run_nlp
+    },
+    'cluster': {
+        'after': ['nlp'],
+        'code': ['strategy clustering/strategy_clustering.py', 'strategy clustering/features.py',
+                 'strategy clustering/clustering.py', 'nlp/project_paths.py', 'nlp/streaming_tfidf.py',
+                 'nlp/analyze_image_text.py', 'columnar.py'],
+        'inputs': ['collected_ads_enriched.csv', 'nlp/image_text_analysis.csv'],
+        'outputs': ['strategy clustering/ads_with_strategies.csv'],
+        'run': run_cluster
+    }
+}
+
+
+# FINGERPRINTS
+def file_fingerprint(path):
+    ''' size + mtime of a data file or directory, None if it does not exist'''
+    try: st = os.stat(path)
+    except FileNotFoundError: return None
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+def code_fingerprint(path):
+    ''' content hash: a checkout or copy changes mtimes without changing code'''
+    try:
+        with open(path, 'rb') as f: return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError: return None
+
+def input_fingerprint(name):
+    stage = STAGES[name]
+    inputs = [os.path.join(ROOT, p) for p in stage['inputs']]
+    if 'extra_inputs' in stage: inputs += [os.path.join(ROOT, p) for p in stage['extra_inputs']()]
+    parts = {
+        'code': {p: code_fingerprint(os.path.join(ROOT, p)) for p in stage['code']},
+        'inputs': {os.path.relpath(p, ROOT): file_fingerprint(p) for p in inputs}
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys = True).encode('utf-8')).hexdigest()
+
+def output_fingerprints(name):
+    return {p: file_fingerprint(os.path.join(ROOT, p)) for p in STAGES[name]['outputs']}
+
+
+def load_state(path = STATE_FILE):
+    if not os.path.exists(path): return {}
+    with open(path, 'r') as f: return json.load(f)
+
+def save_state(state, path = STATE_FILE):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f: json.dump(state, f, indent = 2, sort_keys = True)
+    os.replace(tmp, path)
+
+
+def is_current(name, state):
+    ''' Whether the stage's last run still stands: same code and inputs, outputs untouched'''
+    done = state.get(name)
+    if done is None: return False
+    outputs = output_fingerprints(name)
+    if None in outputs.values() or outputs != done['outputs']: return False
+    return done['inputs'] == input_fingerprint(name)
+
+
+# SCHEDULING
+def with_upstream(targets):
+    ''' targets plus every stage they depend on, in STAGES order'''
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name in needed: continue
+        needed.add(name)
+        todo.extend(STAGES[name]['after'])
+    return [name for name in STAGES if name in needed]
+
+def run_stage_process(name, lock):
+    '''
+    Runs one stage as `python pipeline.py --stage name`, echoing its output
+    with a [name] prefix. Returns (exit code, seconds)
+    '''
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-u', os.path.abspath(__file__), '--stage', name], cwd = ROOT,
+        stdout = subprocess.PIPE, stderr = subprocess.STDOUT, text = True
+    )
+    for line in proc.stdout:
+        with lock: print(f'[{name}] {line}', end = '', flush = True)
+    return proc.wait(), time.perf_counter() - start
+
+
+def run_pipeline(targets = None, force = (), dry_run = False, jobs = None, profile = False):
+    '''
+    Runs the out-of-date stages among targets (default: all) and their upstream.
+    force: stages to re-run even if current; stages after a re-run stage re-check their inputs.
+    jobs: most stages at once, None for no limit.
+    profile: cProfile each stage that runs (see instrumentation.py).
+    Returns {stage: 'ran' | 'skipped' | 'would run' | 'failed' | 'not run'}
+    '''
+    stages = with_upstream(targets or list(STAGES))
+    state = load_state()
+    status = {}
+    pending = list(stages)
+    running = {}
+    lock = threading.Lock()
+    if not dry_run: instrumentation.start(profile = profile)  # inherited by the stage processes
+
+    def ready(name):
+        return all(status.get(dep) in ('ran', 'skipped', 'would run') for dep in STAGES[name]['after'] if dep in stages)
+
+    with ThreadPoolExecutor(max_workers = jobs or len(stages)) as pool:
+        while pending or running:
+            decided = [n for n in pending if ready(n)]
+            for name in decided:
+                pending.remove(name)
+                # an upstream stage that (would have) re-run changes this stage's inputs
+                upstream_ran = any(status.get(dep) in ('ran', 'would run') for dep in STAGES[name]['after'])
+                if name not in force and not (dry_run and upstream_ran) and is_current(name, state):
+                    status[name] = 'skipped'
+                    print(f'[{name}] up to date, skipped')
+                elif dry_run:
+                    status[name] = 'would run'
+                    print(f'[{name}] would run')
+                else:
+                    print(f'[{name}] running')
+                    running[pool.submit(run_stage_process, name, lock)] = (name, input_fingerprint(name))
+            if not running:
+                if decided: continue  # skipped (or dry-run) stages may have unblocked others
+                # whatever is left waits on a failed stage
+                for name in pending: status[name] = 'not run'
+                break
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                name, inputs = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    status[name] = 'ran'
+                    state[name] = {'inputs': inputs, 'outputs': output_fingerprints(name), 'seconds': round(seconds, 3)}
+                    save_state(state)
+                    print(f'[{name}] done in {seconds:.1f}s')
+                else:
+                    status[name] = 'failed'
+                    print(f'[{name}] failed (exit code {code})')
+
+    print('Pipeline summary')
+    for name in stages: print(f'{name} {status[name]}')
+    if 'ran' in status.values() or 'failed' in status.values(): instrumentation.report()
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run the ads pipeline, skipping stages that are up to date.')
+    parser.add_argument('targets', nargs = '*', metavar = 'stage',
+                        help = f'stages to bring up to date (default: all of {", ".join(STAGES)})')
+    parser.add_argument('--force', nargs = '*', default = [], choices = list(STAGES), metavar = 'stage',
+                        help = 'stages to re-run even if up to date (no names: the targets, not their upstream)')
+    parser.add_argument('--dry-run', action = 'store_true', help = 'only print what would run')
+    parser.add_argument('--jobs', type = int, default = None, help = 'most stages run at once')
+    parser.add_argument('--profile', action = 'store_true', help = 'write a cProfile dump per stage')
+    parser.add_argument('--stage', choices = list(STAGES), help = argparse.SUPPRESS)  # child process
+    args = parser.parse_args()
+    unknown = [name for name in args.targets if name not in STAGES]
+    if unknown: parser.error(f'unknown stage(s) {", ".join(unknown)}; choose from {", ".join(STAGES)}')
+
+    if args.stage:
+        os.chdir(ROOT)
+        sys.path.insert(0, ROOT)
+        instrumentation.run_stage(args.stage, STAGES[args.stage]['run'])
+        sys.exit()
+
+    force = args.force
+    if '--force' in sys.argv and not force: force = args.targets or list(STAGES)
+    status = run_pipeline(args.targets, force = set(force), dry_run = args.dry_run, jobs = args.jobs,
+                          profile = args.profile)
+    sys.exit(1 if 'failed' in status.values() else 0)
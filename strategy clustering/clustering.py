@@ -0,0 +1,151 @@
+"""
+Clustering engine for the reduced strategy features (see features.py).
+
+Everything here stays sub-quadratic, so it scales past a few thousand ads:
+- mini-batch k-means instead of full KMeans
+- HDBSCAN on a precomputed, sparse k-nearest-neighbor distance graph
+  (approximate neighbors through pynndescent for large inputs when it is
+  installed, exact sklearn NearestNeighbors otherwise) instead of all
+  pairwise distances
+- silhouette estimated on a stratified sample instead of the full O(n^2)
+  distance matrix
+
+    labels = kmeans_labels(X, k=4)
+    labels = hdbscan_labels(X, min_cluster_size=10)
+    score = sampled_silhouette(X, labels)
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
+
+RANDOM_STATE = 42
+KMEANS_BATCH_SIZE = 4096
+KNN_NEIGHBORS = 15
+# pynndescent pays ~40 s of numba compilation per process; below this many rows
+# exact neighbors are faster
+APPROX_KNN_MIN_ROWS = 100_000
+MIN_DISTANCE = 1e-9  # stored instead of 0 between identical rows
+SILHOUETTE_SAMPLE = 5000
+MIN_PER_CLUSTER = 10  # silhouette sample floor per cluster (if it has that many)
+
+
+def kmeans_labels(X, k: int, batch_size: int = KMEANS_BATCH_SIZE,
+                  random_state: int = RANDOM_STATE, return_model: bool = False):
+    """Cluster labels from MiniBatchKMeans (k clusters)."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    model = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=3, random_state=random_state)
+    labels = model.fit_predict(X)
+    return (labels, model) if return_model else labels
+
+
+def _nndescent():
+    try:
+        from pynndescent import NNDescent
+    except ImportError:
+        return None
+    return NNDescent
+
+
+def knn_graph(X, n_neighbors: int = KNN_NEIGHBORS, approximate: bool | None = None,
+              random_state: int = RANDOM_STATE) -> sparse.csr_matrix:
+    """Symmetric sparse distance graph to each point's n_neighbors nearest neighbors.
+
+    approximate=None picks pynndescent (if installed) from APPROX_KNN_MIN_ROWS
+    rows up, exact sklearn NearestNeighbors below that or without it.
+    """
+    X = np.require(X, dtype=np.float32, requirements=['C', 'W'])  # numba rejects read-only memmaps
+    n = X.shape[0]
+    n_neighbors = min(n_neighbors, n - 1)
+    if approximate is None:
+        approximate = n >= APPROX_KNN_MIN_ROWS
+    NNDescent = _nndescent() if approximate else None
+    if NNDescent is None:
+        from sklearn.neighbors import NearestNeighbors
+
+        graph = NearestNeighbors(n_neighbors=n_neighbors).fit(X).kneighbors_graph(mode='distance')
+    else:
+        index = NNDescent(X, n_neighbors=n_neighbors + 1, random_state=random_state)
+        idx, dist = index.neighbor_graph
+        rows = np.repeat(np.arange(n), n_neighbors)
+        # drop each point's self-match (first column)
+        graph = sparse.csr_matrix((dist[:, 1:].ravel(), (rows, idx[:, 1:].ravel())), shape=(n, n))
+    # duplicate ads are at distance 0, which sparse ops would drop as "no edge"
+    graph.data = np.maximum(graph.data, MIN_DISTANCE)
+    graph = graph.maximum(graph.T).tocsr()
+    return connect_components(graph, X)
+
+
+def connect_components(graph: sparse.csr_matrix, X) -> sparse.csr_matrix:
+    """Adds the fewest edges that make graph connected (HDBSCAN needs one component).
+
+    Each component is represented by its point closest to the component mean;
+    the representatives are joined by their minimum spanning tree.
+    """
+    n_comp, comp = connected_components(graph, directed=False)
+    if n_comp == 1:
+        return graph
+    reps = []
+    for c in range(n_comp):
+        members = np.flatnonzero(comp == c)
+        center = X[members].mean(axis=0)
+        reps.append(members[np.argmin(((X[members] - center) ** 2).sum(axis=1))])
+    reps = np.array(reps)
+    R = X[reps].astype(np.float64)
+    sq = (R ** 2).sum(axis=1)
+    dist = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2 * R @ R.T, 0))
+    tree = minimum_spanning_tree(np.triu(dist + 1e-12, k=1)).tocoo()
+    bridges = sparse.csr_matrix(
+        (np.concatenate([tree.data, tree.data]),
+         (np.concatenate([reps[tree.row], reps[tree.col]]), np.concatenate([reps[tree.col], reps[tree.row]]))),
+        shape=graph.shape,
+    )
+    return graph.maximum(bridges).tocsr()
+
+
+def hdbscan_labels(X, min_cluster_size: int = 10, n_neighbors: int = KNN_NEIGHBORS,
+                   graph: sparse.csr_matrix | None = None, approximate: bool | None = None):
+    """HDBSCAN labels (-1 = noise) over a precomputed kNN distance graph.
+
+    n_neighbors bounds HDBSCAN's min_samples (core distances come from the graph).
+    """
+    from sklearn.cluster import HDBSCAN
+
+    if graph is None:
+        graph = knn_graph(X, n_neighbors, approximate)
+    min_samples = min(min_cluster_size, n_neighbors)
+    model = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples,
+                    metric='precomputed', copy=True)
+    return model.fit_predict(graph)
+
+
+def stratified_sample(labels, sample_size: int = SILHOUETTE_SAMPLE, min_per_cluster: int = MIN_PER_CLUSTER,
+                      random_state: int = RANDOM_STATE) -> np.ndarray:
+    """Row indices: each label (noise, -1, included) in proportion to its size, with a floor."""
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(random_state)
+    clusters, sizes = np.unique(labels, return_counts=True)
+    total = sizes.sum()
+    picked = []
+    for c, size in zip(clusters, sizes):
+        take = min(size, max(min_per_cluster, int(round(sample_size * size / total))))
+        picked.append(rng.choice(np.flatnonzero(labels == c), take, replace=False))
+    return np.sort(np.concatenate(picked)) if picked else np.array([], dtype=np.int64)
+
+
+def sampled_silhouette(X, labels, sample_size: int = SILHOUETTE_SAMPLE,
+                       random_state: int = RANDOM_STATE) -> float:
+    """silhouette_score(X, labels) estimated on a stratified sample.
+
+    HDBSCAN's noise points (-1) are scored as one more label, as
+    silhouette_score on all points does, so the estimate is comparable
+    with it. NaN when there are fewer than two labels.
+    """
+    from sklearn.metrics import silhouette_score
+
+    idx = stratified_sample(labels, sample_size, random_state=random_state)
+    sample_labels = np.asarray(labels)[idx]
+    if len(np.unique(sample_labels)) < 2:
+        return float('nan')
+    return float(silhouette_score(np.asarray(X)[idx], sample_labels))
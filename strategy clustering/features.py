@@ -0,0 +1,190 @@
+"""
+Feature matrix for strategy clustering, kept sparse end to end.
+
+Text features are TF-IDF over the cleaned OCR text, fit and applied a chunk
+of ads at a time (nlp/streaming_tfidf.StreamingTfidf). Numeric features
+(sentiment, text/image ratio, dominant colors) are standardized and appended
+as a sparse block, so the combined matrix goes into TruncatedSVD without ever
+being densified. Only the reduced (n_ads x n_components) matrix is dense. It
+is cached as a .npy file, keyed by the inputs and settings, and loaded back
+memory-mapped, so later clustering runs skip the whole step.
+
+    ads, X, key = load_reduced()     # computes and caches on first use
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# nlp/ holds the project_paths helper and the NLP modules used here
+NLP_DIR = Path(__file__).resolve().parent.parent / 'nlp'
+if str(NLP_DIR) not in sys.path:
+    sys.path.insert(0, str(NLP_DIR))
+
+from project_paths import PROJECT_ROOT  # also makes the project root's modules importable
+import columnar  # Parquet copies of the CSV hand-offs, when pyarrow is installed
+
+ADS_CSV = PROJECT_ROOT / 'collected_ads_enriched.csv'
+NLP_CSV = PROJECT_ROOT / 'nlp' / 'image_text_analysis.csv'
+CACHE_DIR = Path(__file__).resolve().parent / 'cache'
+
+# Filters (same as the original notebook)
+MIN_OCR_WORDS = 5
+MIN_OCR_CONFIDENCE = 50
+
+# Feature settings
+TFIDF_MAX_FEATURES = 100
+TFIDF_MIN_DF = 5
+SVD_COMPONENTS = 50
+NUMERIC_COLUMNS = ['sentiment_polarity', 'sentiment_subjectivity', 'text_image_ratio']
+COLOR_COLUMNS = ['dominant_color_1', 'dominant_color_2', 'dominant_color_3']
+NUMERIC_WEIGHT = 1.0  # scale of the numeric block relative to the l2-normalized TF-IDF rows
+
+ADS_USECOLS = ['ad_id', 'competitor', 'ocr_text', 'ocr_word_count', 'ocr_confidence_avg',
+               'text_image_ratio', *COLOR_COLUMNS]
+
+
+def load_ads(ads_csv=ADS_CSV, nlp_csv=NLP_CSV) -> pd.DataFrame:
+    """Enriched ads joined with their NLP analysis, filtered and with cleaned OCR text."""
+    ads = columnar.read_frame(ads_csv, columns=ADS_USECOLS)
+    nlp = columnar.read_frame(nlp_csv).drop(columns=['ocr_text'], errors='ignore')
+    df = ads.merge(nlp, on='ad_id', how='inner')
+    df = df[(df['ocr_word_count'] > MIN_OCR_WORDS) & (df['ocr_confidence_avg'] > MIN_OCR_CONFIDENCE)]
+    df = df[df['top_keywords'].notna()].reset_index(drop=True)
+    df['ocr_text'] = clean_text(df['ocr_text'])
+    return df
+
+
+def clean_text(text: pd.Series) -> pd.Series:
+    """Drops URL fragments and digits (OCR noise)."""
+    text = text.fillna('').astype(str)
+    text = text.str.replace(r'\b(www|com|http)\b', '', regex=True)
+    return text.str.replace(r'\d+', '', regex=True)
+
+
+def hex_to_rgb(colors: pd.Series) -> np.ndarray:
+    """'#RRGGBB' strings -> (n, 3) floats in [0, 1]; missing colors are mid gray."""
+    hexes = colors.fillna('#808080').astype(str).str.lstrip('#').str.pad(6, fillchar='0')
+    ints = np.array([int(h[:6], 16) for h in hexes], dtype=np.int64)
+    return np.stack([(ints >> 16) & 255, (ints >> 8) & 255, ints & 255], axis=1) / 255.0
+
+
+def numeric_block(df: pd.DataFrame) -> np.ndarray:
+    """(n, len(NUMERIC_COLUMNS) + 3 * len(COLOR_COLUMNS)) raw numeric features, before scaling."""
+    cols = [df[NUMERIC_COLUMNS].fillna(0).to_numpy(dtype=np.float64)]
+    cols += [hex_to_rgb(df[c]) for c in COLOR_COLUMNS]
+    return np.hstack(cols)
+
+
+class StrategyFeatures:
+    """Fitted TF-IDF + scaler + SVD; sparse assembly, dense only after reduction."""
+
+    def __init__(self, max_features: int = TFIDF_MAX_FEATURES, min_df: int = TFIDF_MIN_DF,
+                 n_components: int = SVD_COMPONENTS, numeric_weight: float = NUMERIC_WEIGHT,
+                 random_state: int = 42):
+        self.max_features = max_features
+        self.min_df = min_df
+        self.n_components = n_components
+        self.numeric_weight = numeric_weight
+        self.random_state = random_state
+
+    def settings(self) -> dict:
+        return {
+            'max_features': self.max_features, 'min_df': self.min_df,
+            'n_components': self.n_components, 'numeric_weight': self.numeric_weight,
+            'random_state': self.random_state, 'numeric': NUMERIC_COLUMNS, 'colors': COLOR_COLUMNS,
+        }
+
+    def sparse_matrix(self, df: pd.DataFrame, fit: bool = False) -> sparse.csr_matrix:
+        """[TF-IDF | scaled numeric] as one CSR matrix."""
+        from sklearn.preprocessing import StandardScaler
+        from streaming_tfidf import StreamingTfidf, in_chunks
+
+        texts = df['ocr_text'].tolist()
+        if fit:
+            self.vectorizer = StreamingTfidf(max_features=self.max_features, min_df=self.min_df)
+            self.vectorizer.fit(in_chunks(texts))
+            self.scaler = StandardScaler()
+            numeric = self.scaler.fit_transform(numeric_block(df))
+        else:
+            numeric = self.scaler.transform(numeric_block(df))
+        text = sparse.vstack([self.vectorizer.transform(c) for c in in_chunks(texts)], format='csr')
+        numeric = sparse.csr_matrix(numeric * self.numeric_weight)
+        return sparse.hstack([text, numeric], format='csr', dtype=np.float64)
+
+    def fit_transform(self, df: pd.DataFrame) -> np.ndarray:
+        from sklearn.decomposition import TruncatedSVD
+
+        X = self.sparse_matrix(df, fit=True)
+        n_components = min(self.n_components, X.shape[1] - 1)
+        self.svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        return self.svd.fit_transform(X)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        return self.svd.transform(self.sparse_matrix(df))
+
+
+def file_digest(path) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(features: StrategyFeatures, ads_csv=ADS_CSV, nlp_csv=NLP_CSV) -> str:
+    """Short hash of the input files' contents and the feature settings."""
+    blob = json.dumps({
+        'ads': file_digest(ads_csv), 'nlp': file_digest(nlp_csv),
+        'filters': [MIN_OCR_WORDS, MIN_OCR_CONFIDENCE], 'settings': features.settings(),
+    }, sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+
+def _save_atomic(path: Path, write):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def cache_paths(key: str, cache_dir=CACHE_DIR) -> tuple[Path, Path]:
+    """(reduced matrix .npy, fitted StrategyFeatures .pkl) for a cache key."""
+    cache_dir = Path(cache_dir)
+    return cache_dir / f'reduced_{key}.npy', cache_dir / f'features_{key}.pkl'
+
+
+def load_fitted(key: str, cache_dir=CACHE_DIR) -> StrategyFeatures:
+    """The StrategyFeatures that produced the cached matrix for this key."""
+    with open(cache_paths(key, cache_dir)[1], 'rb') as f:
+        return pickle.load(f)
+
+
+def load_reduced(features: StrategyFeatures | None = None, ads_csv=ADS_CSV, nlp_csv=NLP_CSV,
+                 cache_dir=CACHE_DIR, refresh: bool = False):
+    """(ads DataFrame, reduced matrix, cache key).
+
+    The matrix is float32, memory-mapped read-only from the .npy cache; it is
+    computed (and the fitted StrategyFeatures saved alongside) on a cache miss.
+    """
+    features = features or StrategyFeatures()
+    key = cache_key(features, ads_csv, nlp_csv)
+    matrix_path, model_path = cache_paths(key, cache_dir)
+
+    df = load_ads(ads_csv, nlp_csv)
+    if refresh or not (matrix_path.exists() and model_path.exists()):
+        matrix_path.parent.mkdir(parents=True, exist_ok=True)
+        X = features.fit_transform(df).astype(np.float32)
+        _save_atomic(model_path, lambda f: pickle.dump(features, f))
+        _save_atomic(matrix_path, lambda f: np.save(f, X))
+    X = np.load(matrix_path, mmap_mode='r')
+    if X.shape[0] != len(df):
+        raise ValueError(f'{matrix_path} has {X.shape[0]} rows for {len(df)} ads; rerun with refresh=True')
+    return df, X, key
@@ -0,0 +1,180 @@
+"""
+Persisted strategy model: label newly collected ads without re-clustering.
+
+A model bundles everything needed to go from raw ad rows to a strategy:
+the fitted StrategyFeatures (TF-IDF, scaler, SVD), the k-means centroids in
+the reduced space and the cluster -> strategy label map. Models are saved as
+numbered versions under models/; load_model() picks the latest.
+
+k-means cluster ids are arbitrary and change from one fit to the next, so
+the label map is made at fit time: each cluster takes the strategy that the
+previous model version gives most of its training ads (the hand-labelled
+ads_with_strategies.csv for the first version), one strategy per cluster.
+
+    model = train_model()                 # fit on the cached features, save v<N>
+    labels = assign_strategy(new_ads)     # DataFrame: ad_id, cluster, strategy
+    store_strategies(new_ads)             # also write them into ads.sqlite
+
+Assignment is a sparse transform, one SVD projection and a nearest-centroid
+lookup, so batches of ads take milliseconds per thousand.
+"""
+
+import json
+import os
+import pickle
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features import COLOR_COLUMNS, NUMERIC_COLUMNS, PROJECT_ROOT, clean_text, load_reduced
+import columnar  # project root module, importable through features
+
+MODEL_DIR = Path(__file__).resolve().parent / 'models'
+REFERENCE_CSV = Path(__file__).resolve().parent / 'ads_with_strategies.csv'  # hand-labelled strategies
+DB_PATH = PROJECT_ROOT / 'ads.sqlite'
+N_CLUSTERS = 4
+
+
+class StrategyModel:
+    def __init__(self, features, centroids: np.ndarray, cluster_labels: dict, features_key: str,
+                 n_train: int, labels_from: str | None = None):
+        self.features = features            # fitted StrategyFeatures
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.cluster_labels = dict(cluster_labels)
+        self.labels_from = labels_from      # where the strategy names were matched from
+        self.features_key = features_key    # cache key of the training features
+        self.n_train = n_train
+        self.version = None                 # set by save_model
+        self.created_at = time.time()
+
+    def predict(self, ads: pd.DataFrame) -> np.ndarray:
+        """Nearest-centroid cluster id per ad."""
+        X = self.features.transform(prepare(ads))
+        # ||x - c||^2 up to the per-row ||x||^2 term, which does not change the argmin
+        scores = X @ self.centroids.T * -2 + (self.centroids ** 2).sum(axis=1)
+        return scores.argmin(axis=1)
+
+
+def prepare(ads: pd.DataFrame) -> pd.DataFrame:
+    """Feature inputs for raw ad rows: cleaned OCR text, missing numeric/color columns as NaN."""
+    ads = ads.copy()
+    ads['ocr_text'] = clean_text(ads['ocr_text'] if 'ocr_text' in ads else pd.Series('', index=ads.index))
+    for col in NUMERIC_COLUMNS + COLOR_COLUMNS:
+        if col not in ads:
+            ads[col] = np.nan
+    return ads
+
+
+def match_labels(ad_ids, clusters, reference: pd.DataFrame) -> dict:
+    """{cluster id: strategy}, one strategy per cluster, keeping the most ads under the
+    strategy they have in reference (ad_id, strategy). Clusters left over get none."""
+    from scipy.optimize import linear_sum_assignment
+
+    pairs = pd.DataFrame({'ad_id': pd.Series(ad_ids).astype(str).to_numpy(), 'cluster': np.asarray(clusters)})
+    reference = reference.dropna(subset=['strategy']).astype({'ad_id': str})
+    pairs = pairs.merge(reference[['ad_id', 'strategy']], on='ad_id')
+    overlap = pd.crosstab(pairs['cluster'], pairs['strategy'])
+    rows, cols = linear_sum_assignment(overlap.to_numpy(), maximize=True)
+    return {int(overlap.index[r]): overlap.columns[c] for r, c in zip(rows, cols)}
+
+
+def reference_strategies(ads: pd.DataFrame, model_dir=MODEL_DIR) -> tuple[pd.DataFrame, str]:
+    """(ad_id, strategy) the next model's names are matched to, and where they came from:
+    the latest model's assignment of these ads, else REFERENCE_CSV."""
+    if model_versions(model_dir):
+        previous = load_model(model_dir=model_dir)
+        return assign_strategy(ads, previous), f'v{previous.version}'
+    return columnar.read_frame(REFERENCE_CSV, columns=['ad_id', 'strategy']), REFERENCE_CSV.name
+
+
+def train_model(k: int = N_CLUSTERS, cluster_labels: dict | None = None, save: bool = True,
+                model_dir=MODEL_DIR) -> StrategyModel:
+    """Mini-batch k-means on the cached reduced features, packaged as a StrategyModel.
+
+    cluster_labels ({cluster id of this fit: strategy}) is matched to
+    reference_strategies() unless given.
+    """
+    from clustering import kmeans_labels
+    from features import load_fitted
+
+    df, X, key = load_reduced()
+    clusters, kmeans = kmeans_labels(X, k, return_model=True)
+    labels_from = 'manual'
+    if cluster_labels is None:
+        reference, labels_from = reference_strategies(df, model_dir)
+        cluster_labels = match_labels(df['ad_id'], clusters, reference)
+    model = StrategyModel(load_fitted(key), kmeans.cluster_centers_, cluster_labels, key, len(df), labels_from)
+    if save:
+        save_model(model, model_dir)
+    return model
+
+
+def model_versions(model_dir=MODEL_DIR) -> list[int]:
+    found = (re.fullmatch(r'strategy_model_v(\d+)\.pkl', p.name) for p in Path(model_dir).glob('*.pkl'))
+    return sorted(int(m.group(1)) for m in found if m)
+
+
+def save_model(model: StrategyModel, model_dir=MODEL_DIR) -> Path:
+    """Writes the next version (v1, v2, ...) plus a small JSON card; returns the pickle path."""
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model.version = (model_versions(model_dir) or [0])[-1] + 1
+    path = model_dir / f'strategy_model_v{model.version}.pkl'
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(model, f)
+    os.replace(tmp, path)
+    card = {
+        'version': model.version, 'created_at': model.created_at, 'features_key': model.features_key,
+        'n_train': model.n_train, 'n_clusters': len(model.centroids),
+        'cluster_labels': {str(c): label for c, label in model.cluster_labels.items()},
+        'labels_from': model.labels_from,
+        'features': model.features.settings(),
+    }
+    path.with_suffix('.json').write_text(json.dumps(card, indent=2))
+    return path
+
+
+def load_model(version: int | None = None, model_dir=MODEL_DIR) -> StrategyModel:
+    """A saved model version; the latest by default."""
+    versions = model_versions(model_dir)
+    if not versions:
+        raise FileNotFoundError(f'no strategy model in {model_dir}; run train_model() first')
+    version = versions[-1] if version is None else version
+    with open(Path(model_dir) / f'strategy_model_v{version}.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+def assign_strategy(ads: pd.DataFrame, model: StrategyModel | None = None,
+                    batch_size: int = 10_000) -> pd.DataFrame:
+    """ad_id, cluster and strategy for each ad row (enriched CSV columns, NLP columns optional)."""
+    model = model or load_model()
+    clusters = np.concatenate([
+        model.predict(ads.iloc[i:i + batch_size]) for i in range(0, len(ads), batch_size)
+    ]) if len(ads) else np.array([], dtype=np.int64)
+    return pd.DataFrame({
+        'ad_id': ads['ad_id'].to_numpy(),
+        'cluster': clusters,
+        'strategy': [model.cluster_labels.get(int(c)) for c in clusters],
+    })
+
+
+def store_strategies(ads: pd.DataFrame, model: StrategyModel | None = None, db_path=DB_PATH) -> int:
+    """assign_strategy() and write the labels into ads.strategy; returns the ads updated."""
+    import data_store  # project root module, importable through features
+
+    model = model or load_model()
+    labels = assign_strategy(ads, model)
+    conn = data_store.connect(db_path)
+    try:
+        return data_store.write_strategies(conn, zip(labels['ad_id'], labels['strategy']), model.version)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    model = train_model()
+    print(f"Saved strategy model v{model.version} ({model.n_train} ads, {len(model.centroids)} clusters)")
@@ -0,0 +1,150 @@
+"""
+Parallel model-selection sweep for strategy clustering.
+
+Evaluates a grid of mini-batch k-means k values and HDBSCAN min_cluster_size
+values, each at several SVD dimensions, on the cached reduced feature matrix
+(features.load_reduced). Lower dimensions are the leading columns of that
+matrix: TruncatedSVD orders its components by singular value.
+
+The matrix is copied once into shared memory and every pool worker maps it,
+instead of each task receiving a pickled copy. Each grid point reports:
+sampled silhouette, Davies-Bouldin, number of clusters, noise points,
+cluster sizes and fit time. Results are stored in an SQLite file keyed by
+the feature cache key and the grid point, so a rerun only evaluates points
+it has not seen for the same features.
+
+Run from the project root:
+    python "strategy clustering/sweep.py"
+"""
+
+import json
+import os
+import sqlite3
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from clustering import hdbscan_labels, kmeans_labels, sampled_silhouette
+from features import CACHE_DIR, SVD_COMPONENTS, load_reduced
+
+RESULTS_DB = CACHE_DIR / 'sweep_results.sqlite'
+K_VALUES = [3, 4, 5, 6, 8, 10, 12]
+MIN_CLUSTER_SIZES = [5, 10, 20, 40, 80]
+SVD_DIMS = [10, 25, SVD_COMPONENTS]
+SWEEP_WORKERS = None  # None = all cores
+
+RESULT_COLUMNS = ['algorithm', 'param', 'dims', 'n_clusters', 'n_noise', 'silhouette',
+                  'davies_bouldin', 'cluster_sizes', 'fit_seconds']
+
+
+def grid(k_values=K_VALUES, min_cluster_sizes=MIN_CLUSTER_SIZES, dims=SVD_DIMS) -> list[tuple]:
+    """[(algorithm, param, dims)] for every combination."""
+    points = [('kmeans', k, d) for d in dims for k in k_values]
+    points += [('hdbscan', m, d) for d in dims for m in min_cluster_sizes]
+    return points
+
+
+def open_results(path=RESULTS_DB) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS results (
+    features_key TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    param INTEGER NOT NULL,
+    dims INTEGER NOT NULL,
+    n_clusters INTEGER NOT NULL,
+    n_noise INTEGER NOT NULL,
+    silhouette REAL,
+    davies_bouldin REAL,
+    cluster_sizes TEXT NOT NULL,
+    fit_seconds REAL NOT NULL,
+    PRIMARY KEY (features_key, algorithm, param, dims)
+    )''')
+    return conn
+
+
+# Worker state: the shared matrix, attached once per process
+_shm = None
+_X = None
+
+
+def init_worker(shm_name: str, shape: tuple, dtype: str):
+    global _shm, _X
+    from threadpoolctl import threadpool_limits
+
+    # one BLAS/OpenMP thread per worker: the pool already uses every core
+    threadpool_limits(1)
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _X = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+
+
+def evaluate(point: tuple) -> tuple:
+    """One grid point on the shared matrix -> a RESULT_COLUMNS row."""
+    from sklearn.metrics import davies_bouldin_score
+
+    algorithm, param, dims = point
+    X = _X[:, :dims]
+    t0 = time.perf_counter()
+    if algorithm == 'kmeans':
+        labels = kmeans_labels(X, param)
+    else:
+        labels = hdbscan_labels(X, min_cluster_size=param)
+    fit_seconds = time.perf_counter() - t0
+
+    clustered = labels >= 0
+    sizes = np.bincount(labels[clustered]) if clustered.any() else np.array([], dtype=np.int64)
+    n_clusters = int((sizes > 0).sum())
+    silhouette = davies_bouldin = None
+    if n_clusters >= 2:
+        silhouette = sampled_silhouette(X, labels)
+        davies_bouldin = float(davies_bouldin_score(X[clustered], labels[clustered]))
+    return (algorithm, param, dims, n_clusters, int((~clustered).sum()), silhouette,
+            davies_bouldin, json.dumps(sorted(sizes[sizes > 0].tolist(), reverse=True)), fit_seconds)
+
+
+def run_sweep(points=None, workers=SWEEP_WORKERS, results_path=RESULTS_DB):
+    """Evaluates the grid points not stored yet; returns all stored results as a DataFrame."""
+    import pandas as pd
+
+    _, X, key = load_reduced()
+    points = points or grid()
+    points = [p for p in points if p[2] <= X.shape[1]]
+    conn = open_results(results_path)
+    done = set(conn.execute(
+        'SELECT algorithm, param, dims FROM results WHERE features_key = ?', (key,)
+    ))
+    todo = [p for p in points if p not in done]
+    print(f"{len(points) - len(todo)} grid points already evaluated, {len(todo)} to run")
+
+    if todo:
+        shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+        try:
+            np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+            with Pool(processes=workers or len(os.sched_getaffinity(0)), initializer=init_worker,
+                      initargs=(shm.name, X.shape, X.dtype.str)) as pool:
+                for row in pool.imap_unordered(evaluate, todo):
+                    with conn:
+                        conn.execute('INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?,?,?,?,?)', (key, *row))
+                    print(f"  {row[0]} param={row[1]} dims={row[2]}: {row[3]} clusters, "
+                          f"silhouette {row[5]}, {row[8]:.2f} s")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    placeholders = ','.join('(?,?,?)' for _ in points)
+    results = pd.read_sql_query(
+        f'SELECT {", ".join(RESULT_COLUMNS)} FROM results '
+        f'WHERE features_key = ? AND (algorithm, param, dims) IN (VALUES {placeholders})',
+        conn, params=[key, *[v for p in points for v in p]],
+    )
+    conn.close()
+    return results.sort_values(['algorithm', 'dims', 'param']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        print(run_sweep())
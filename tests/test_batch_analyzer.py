@@ -0,0 +1,92 @@
+"""
+Pins batch_analyzer's sentiment to TextBlob(text).sentiment, and its top
+words to known outputs.
+
+The expected sentiment was produced by TextBlob 0.20 on these texts: hand-made
+cases for negation, modifiers, "!", "(!)", emoticons, abbreviations and
+Unicode quotes, plus OCR texts from collected_ads_enriched.csv. The expected
+top words of the OCR texts are the ones in the baseline
+nlp/image_text_analysis.csv (counted on NLTK's word_tokenize).
+"""
+
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'nlp'))
+
+from analyze_image_text import stop_words
+from batch_analyzer import analyze_texts, load_lexicon, sentiment, top_words
+
+# (text, TextBlob polarity, TextBlob subjectivity)
+PINNED = [
+    ('This is not good.', -0.35, 0.6000000000000001),
+    ('The service was very good!', 1.0, 0.7800000000000001),
+    ('I am extremely happy :) but not really satisfied', 0.35000000000000003, 1.0),
+    ('Terribly bad, never again (!)', -0.3499999999999999, 0.8333333333333333),
+    ("Great deals... Amazing prices!!! Don't miss out :-(", 0.35000000000000003, 0.8833333333333333),
+    ("e.g. the U.S. market is Mr. Smith's favourite.", 0.0, 0.0),
+    ('“Absolutely wonderful” she said. ’Tis lovely', 0.75, 0.875),
+    ('12345 %%% ---', 0.0, 0.0),
+    ('', 0.0, 0.0),
+    ('590% OFF FOR THE WHOLE FAMILY WOMEN / MEN / GIRLS / BOYS WATER SHOES / BEACH TOWELS', 0.2, 0.4),
+    ('‘This is whole soy. Small in size, big in nutrients,', -0.016666666666666663, 0.3),
+    ('An excellent source of potato chips. pa sl ak of al', 1.0, 1.0),
+    ('BIGGEST BUY ON EARTH CARNWAL of 8 FLAVORS!', 0.0, 0.0),
+    ('OREO 100° 1912 | MODERN CUBISM This year, OREO turns 100 years young Celebrate the kid inside '
+     'at oreo.com/birthday. IDE:', 0.15000000000000002, 0.35),
+    ("Don't, MINDTHE GAP The whole experience, London 2012", 0.2, 0.4),
+    ('See the Leaning Tower of Pizza Visit the Italian places now...', 0.0, 0.0),
+    ('BEST WISHES TO THOSE WHO ALWAYS FOLLOW THEIR OWN PASSION. MERRY CHRISTMAS BY BMW MOTORRAD.', 0.8, 0.65),
+    ('“—™ He who dies with the most toys is still dead. Live richly:', 0.20284090909090907, 0.5375),
+    ('you see a cat. she sees a home. adopt one now. visit caraphil.org', 0.0, 0.0),
+]
+
+
+# (text, top 3 words)
+TOP_WORDS = [
+    ("For she's eating Necco Wafers. COOL, CRISP, REFRESHING DISKS OF MANY FINE FLAVORS IN EACH ASSORTED "
+     "ROLL.", ['eating', 'necco', 'wafers']),
+    ("HEY YOU ABOUT TO USE COMIC SANS FOR THAT THING YOURE MAKING... Let's make this world a more beautiful "
+     "place. liliribs.com", ['hey', 'use', 'comic']),
+    ('Let ‘em know youre SD JOCKEY. POUCH Firefighters Dallas, TX November 20, 1998', ['let', 'em', 'know']),
+    ('1928 | INVENTION OF THE YO-YO This year, OREO turns 100 years young. Celebrate the kid inside at '
+     'oreo.com/birthday.', ['1928', 'invention', 'year']),
+    ('EACH HELPS TO BEAT THE DEATH PENAL 1 EURO OF EACH 1.17 EURO/TEXT GOES TO ISH! V UP ul! Fay 4',
+     ['helps', 'beat', 'death']),
+    ('for more information on lung cancer, keep smoking. — the lung association british colombia',
+     ['lung', 'information', 'cancer']),
+    ("Don't stop. DON'T STOP! Stop the clock, stop the world.", ['stop', 'clock', 'world']),
+    ('', []),
+]
+
+
+@pytest.mark.parametrize('text, polarity, subjectivity', PINNED)
+def test_sentiment_matches_textblob(text, polarity, subjectivity):
+    assert sentiment(text, load_lexicon()) == pytest.approx((polarity, subjectivity), abs=1e-12)
+
+
+@pytest.mark.parametrize('text, words', TOP_WORDS)
+def test_top_words(text, words):
+    assert top_words(load_lexicon().tokenize(text), stop_words(), 3) == words
+
+
+def test_analyze_texts():
+    texts = [text for text, _ in TOP_WORDS]
+    rows = analyze_texts(texts, stop_words(), 3, workers=1)
+    assert [words for _, _, words in rows] == [words for _, words in TOP_WORDS]
+    assert [(p, s) for p, s, _ in rows] == [tuple(round(v, 4) for v in sentiment(t)) for t in texts]
+
+
+def test_analyze_texts_offline(monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError('batch_analyzer tried to reach the network')
+
+    monkeypatch.setattr(socket.socket, 'connect', no_network)
+    monkeypatch.setattr(socket, 'create_connection', no_network)
+    load_lexicon.cache_clear()  # load the bundled lexicon again, with the network blocked
+    rows = analyze_texts(['This is not good.', "Don't stop. DON'T STOP!"], stop_words(), 3,
+                         batch_size=1, workers=2)
+    assert rows == [(-0.35, 0.6, ['good']), (0.0, 0.0, ['stop'])]